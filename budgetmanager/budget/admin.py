@@ -7,4 +7,5 @@ admin.site.register(Home)
 admin.site.register(Account)
 admin.site.register(Operation)
 admin.site.register(Label)
-admin.site.register(OperationPlan)
\ No newline at end of file
+admin.site.register(OperationPlan)
+admin.site.register(MonthlySummary)
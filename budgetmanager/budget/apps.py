@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def warm_registry(sender, using='default', **kwargs):
+    """Creates the global labels, permission groups and permissions and caches their IDs after migrations."""
+
+    from django.contrib.auth.management import create_permissions
+    from .models import warm_registry
+
+    # The budget app is listed before auth, so its permissions may not exist yet
+    create_permissions(sender, verbosity=0, using=using)
+    warm_registry()
+
 
 class BudgetConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'budget'
-    
\ No newline at end of file
+
+    def ready(self):
+        from . import cache
+
+        post_migrate.connect(warm_registry, sender=self)
+        cache.connect_signals()
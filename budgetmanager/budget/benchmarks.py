@@ -0,0 +1,320 @@
+import decimal
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from io import StringIO
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import cache, roles
+from .models import ADMIN_GROUP, MOD_GROUP, Account, Home, Label, MonthlySummary, Operation, OperationPlan
+from .utils import today
+
+SEED_PREFIX = 'seed'
+"""Prefix of the seeded Home names and usernames."""
+
+BATCH_SIZE = 1000
+"""Number of rows inserted at once while seeding."""
+
+LABEL_WEIGHTS = {
+    'Food': 30,
+    'Bills': 10,
+    'Transport': 12,
+    'Clothing': 6,
+    'Entertainment': 8,
+    'Health': 4,
+    None: 10,
+}
+"""Relative frequencies of the expense labels. None stands for unlabeled operations."""
+
+INCOME_RATIO = 0.1
+"""Fraction of the operations which are income."""
+
+FINALIZED_RATIO = 0.85
+"""Fraction of the operations which are finalized."""
+
+
+class Seeder:
+    """Deterministic generator of synthetic Homes, Accounts, operations and plans.
+    The same arguments and seed always produce the same data relative to the `end` date.
+    """
+
+    def __init__(self, homes: int, accounts: int, operations: int, plans: int,
+                 seed: int = 0, days: int = 365, end: date | None = None):
+        self.homes = homes
+        self.accounts = min(accounts, Home.MAX_ACCOUNTS)
+        self.operations = operations
+        self.plans = plans
+        self.days = days
+        self.end = end or today()
+        self.prefix = f'{SEED_PREFIX}{seed}'
+        self.random = random.Random(seed)
+
+    def run(self) -> dict[str, int]:
+        """Creates the data in a single transaction. Returns the numbers of created rows."""
+
+        with transaction.atomic():
+            accounts = self._create_accounts()
+            labels = self._create_labels()
+            operations = self._create_operations(accounts, labels)
+            plans = self._create_plans(accounts, labels)
+            self._update_accounts(accounts)
+            MonthlySummary.rebuild([account.id for account in accounts])
+
+        # Bulk inserts send no signals and IDs of removed rows may be reused
+        for home_id in self.home_ids:
+            roles.invalidate(home_id)
+            cache.invalidate_home(home_id)
+        for account in accounts:
+            cache.invalidate_account(account.id)
+
+        return {'homes': self.homes, 'accounts': len(accounts), 'operations': operations, 'plans': plans}
+
+    def exists(self):
+        """Checks if data with this seed was already created."""
+
+        return Home.objects.filter(name__startswith=f'{self.prefix}-').exists()
+
+    def clear(self):
+        """Removes the data created with this seed."""
+
+        with transaction.atomic():
+            Home.objects.filter(name__startswith=f'{self.prefix}-').delete()
+            User.objects.filter(username__startswith=f'{self.prefix}-').delete()
+
+    def _create_accounts(self) -> list[Account]:
+        """Creates the Homes with their users and Accounts. The first Account of every Home is its Admin."""
+
+        homes = Home.objects.bulk_create([
+            Home(name=f'{self.prefix}-{i}', currency=self.random.choice(Home.Currency.values))
+            for i in range(self.homes)])
+
+        users = User.objects.bulk_create([
+            User(username=f'{self.prefix}-{i}-{j}', first_name=f'User {i}.{j}', password='!')
+            for i in range(self.homes) for j in range(self.accounts)], batch_size=BATCH_SIZE)
+
+        accounts = Account.objects.bulk_create([
+            Account(user=user, home=homes[n // self.accounts]) for n, user in enumerate(users)],
+            batch_size=BATCH_SIZE)
+
+        admins = accounts[::self.accounts]
+        for home, admin in zip(homes, admins):
+            home.admin = admin
+        Home.objects.bulk_update(homes, ['admin'], batch_size=BATCH_SIZE)
+
+        memberships = User.groups.through
+        memberships.objects.bulk_create(
+            [memberships(user_id=admin.user_id, group_id=Home.get_group_id(name))
+             for admin in admins for name in (ADMIN_GROUP, MOD_GROUP)], batch_size=BATCH_SIZE)
+
+        self.home_ids = [home.id for home in homes]
+        return accounts
+
+    def _create_labels(self) -> dict[int, dict[str, int]]:
+        """Creates the default labels of the Homes. Returns the label IDs by Home ID and name."""
+
+        Label.objects.bulk_create([
+            Label(name=name, home_id=home_id, is_default=True)
+            for home_id in self.home_ids for name in sorted(Label.DEFAULT_LABELS)], batch_size=BATCH_SIZE)
+
+        labels = {}
+        for label_id, home_id, name in Label.objects.filter(home_id__in=self.home_ids).values_list(
+                'id', 'home_id', 'name'):
+            labels.setdefault(home_id, {})[name] = label_id
+
+        return labels
+
+    def _random_label(self, labels: dict[str, int]) -> int | None:
+        names = [name for name in LABEL_WEIGHTS if name is None or name in labels]
+        name = self.random.choices(names, weights=[LABEL_WEIGHTS[name] for name in names])[0]
+        return labels.get(name)
+
+    def _random_day(self) -> date:
+        """Returns a random day in the seeded period. Recent days are more likely."""
+
+        return self.end - timedelta(days=int(self.random.triangular(0, self.days, 0)))
+
+    def _random_amount(self, income: bool) -> decimal.Decimal:
+        """Returns a realistic amount: rare large incomes and log-normally distributed expenses."""
+
+        value = self.random.uniform(1500, 6000) if income else min(self.random.lognormvariate(3, 1), 5000)
+        amount = decimal.Decimal(str(round(value, 2)))
+        return amount if income else -amount
+
+    def _create_operations(self, accounts: list[Account], labels: dict) -> int:
+        """Creates the operations of every Account in batches and sets their creation dates."""
+
+        total = 0
+        for account in accounts:
+            ops, days = [], []
+            for _ in range(self.operations):
+                income = self.random.random() < INCOME_RATIO
+                day = self._random_day()
+                finalized = self.random.random() < FINALIZED_RATIO
+                final_date = min(day + timedelta(days=self.random.randint(0, 3)), self.end) if finalized else None
+
+                ops.append(Operation(
+                    account=account, amount=self._random_amount(income), final_date=final_date,
+                    label_id=None if income else self._random_label(labels[account.home_id]),
+                    description=self.random.choice(['', 'Shop', 'Monthly', 'Card payment', 'Transfer'])))
+                days.append(day)
+
+            ops = Operation.objects.bulk_create(ops, batch_size=BATCH_SIZE)
+
+            # `creation_date` is set on insert, so the generated dates are written afterwards
+            for op, day in zip(ops, days):
+                op.creation_date = day
+            Operation.objects.bulk_update(ops, ['creation_date'], batch_size=BATCH_SIZE)
+            total += len(ops)
+
+        return total
+
+    def _create_plans(self, accounts: list[Account], labels: dict) -> int:
+        """Creates operation plans due in the near past or future."""
+
+        plans = [
+            OperationPlan(
+                account=account, amount=self._random_amount(self.random.random() < 0.3),
+                label_id=self._random_label(labels[account.home_id]), description='Planned',
+                period=self.random.choice(OperationPlan.TimePeriod.values),
+                period_count=self.random.randint(1, 3),
+                next_date=self.end + timedelta(days=self.random.randint(-10, 30)))
+            for account in accounts for _ in range(self.plans)]
+
+        return len(OperationPlan.objects.bulk_create(plans, batch_size=BATCH_SIZE))
+
+    def _update_accounts(self, accounts: list[Account]):
+        """Sets the balances and plan watermarks of the Accounts from the created rows."""
+
+        for account in accounts:
+            account.recalculate_amounts()
+
+        Account.sync_next_plan_dates(home_id__in=self.home_ids)
+
+
+class Benchmark:
+    """Times the hot paths of the application on existing (e.g. seeded) data.
+
+    Every scenario runs `iterations` times after `warmup` runs. Scenarios which change data
+    run in a transaction which is rolled back, so every iteration sees the same database.
+    """
+
+    def __init__(self, account: Account, iterations: int = 20, warmup: int = 2):
+        self.account = account
+        self.iterations = iterations
+        self.warmup = warmup
+
+        self.client = Client(HTTP_HOST=self._get_host())
+        self.client.force_login(account.user)
+
+        self.destination = Account.objects.filter(home_id=account.home_id).exclude(id=account.id).first()
+
+    def scenarios(self) -> dict[str, Callable[[], object]]:
+        """Returns the timed scenarios by name."""
+
+        scenarios = {
+            'user_view': lambda: self._get('/user'),
+            'history_view': lambda: self._get('/user/history'),
+            'home_view': lambda: self._get('/home'),
+            'planoperations': self._rolled_back(lambda: call_command('planoperations', stdout=StringIO())),
+            'recalculate_amounts': self._rolled_back(self.account.recalculate_amounts),
+        }
+        if self.destination:
+            scenarios['make_transaction'] = self._rolled_back(
+                lambda: self.account.make_transaction(self.destination, 1, 'Benchmark'))
+
+        return scenarios
+
+    def run(self, names: list[str] | None = None) -> dict[str, dict]:
+        """Runs the scenarios (all by default) and returns their results by name."""
+
+        scenarios = self.scenarios()
+        return {name: self._measure(func) for name, func in scenarios.items() if not names or name in names}
+
+    def _measure(self, func: Callable[[], object]) -> dict:
+        for _ in range(self.warmup):
+            func()
+
+        timings, queries = [], []
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': int(statistics.median(queries)),
+        }
+
+    @staticmethod
+    def _get_host():
+        """Returns a host name accepted by the `ALLOWED_HOSTS` setting."""
+
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+        return hosts[0] if hosts else 'localhost'
+
+    def _get(self, url: str):
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}.')
+
+    @staticmethod
+    def _rolled_back(func: Callable[[], object]):
+        """Wraps the function so its changes are rolled back."""
+
+        def wrapper():
+            with transaction.atomic():
+                func()
+                transaction.set_rollback(True)
+
+        return wrapper
+
+
+def find_account(username: str | None = None) -> Account:
+    """Returns the Account with the username or the seeded Home Admin with the most operations."""
+
+    accounts = Account.objects.select_related('user', 'home')
+    if username:
+        return accounts.get(user__username=username)
+
+    return accounts.filter(home__admin=F('pk'), home__name__startswith=SEED_PREFIX).annotate(
+        operation_count=Count('operation')).order_by('-operation_count', 'id').first()
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Compares the results with a baseline. Returns descriptions of the scenarios slower
+    than `threshold` times the baseline p50 or making more queries.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+
+        if result['p50_ms'] > base['p50_ms'] * threshold:
+            regressions.append(f'{name}: p50 {base["p50_ms"]} ms -> {result["p50_ms"]} ms')
+        if result['queries'] > base['queries']:
+            regressions.append(f'{name}: queries {base["queries"]} -> {result["queries"]}')
+
+    return regressions
+
+
+def dump(results: dict, meta: dict) -> str:
+    """Serializes the results with their metadata to JSON."""
+
+    return json.dumps({'meta': meta, 'results': results}, indent=2, sort_keys=True)
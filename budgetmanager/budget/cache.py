@@ -0,0 +1,162 @@
+from collections import Counter
+from threading import Lock
+from typing import Any, Callable
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = getattr(settings, 'BUDGET_CACHE_ALIAS', 'budget')
+"""Alias of the Django cache (see the CACHES setting) storing the fragments."""
+
+TIMEOUT = getattr(settings, 'BUDGET_CACHE_TIMEOUT', 300)
+"""Number of seconds a fragment is kept in the cache."""
+
+_hits = Counter()
+_misses = Counter()
+_lock = Lock()
+
+
+def get_cache():
+    """Returns the fragment cache backend. Falls back to the default cache if the alias is not configured."""
+
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else 'default']
+
+
+def get_fragment(name: str, account, compute: Callable[[], Any]):
+    """Returns the Account's fragment data from the cache, computing and storing it on a miss.
+
+    The key contains the Account's `version` (bumped by bulk updates which send no signals)
+    and the Account's and Home's generations (bumped by the model signals).
+    The computed value must be picklable, e.g. a list of model instances rather than a QuerySet.
+    """
+
+    key = ':'.join(['budget', 'fragment', name, str(account.id), str(account.version), get_generations(account)])
+    cache = get_cache()
+
+    value = cache.get(key)
+    if value is not None:
+        _count(_hits, name)
+        return value
+
+    _count(_misses, name)
+    value = compute()
+    cache.set(key, value, TIMEOUT)
+    return value
+
+
+def get_generations(account) -> str:
+    """Returns the Account's and Home's generations. They change whenever the Account's fragments are invalidated."""
+
+    cache = get_cache()
+    return ':'.join([_get_generation(cache, 'account', account.id), _get_generation(cache, 'home', account.home_id)])
+
+
+def stats() -> dict[str, dict[str, int]]:
+    """Returns the hit and miss counters of this process per fragment name."""
+
+    with _lock:
+        return {name: {'hits': _hits[name], 'misses': _misses[name]} for name in _hits | _misses}
+
+
+def reset_stats():
+    """Resets the hit and miss counters."""
+
+    with _lock:
+        _hits.clear()
+        _misses.clear()
+
+
+def invalidate_account(account_id: int | None):
+    """Invalidates the cached fragments of the Account."""
+
+    _bump_generation('account', account_id)
+
+
+def invalidate_home(home_id: int | None):
+    """Invalidates the cached fragments of all the Accounts in the Home."""
+
+    _bump_generation('home', home_id)
+
+
+def _count(counter: Counter, name: str):
+    with _lock:
+        counter[name] += 1
+
+
+def _generation_key(scope: str, obj_id: int):
+    return f'budget:generation:{scope}:{obj_id}'
+
+
+def _get_generation(cache, scope: str, obj_id: int) -> str:
+    """Returns the current generation token of the Account or Home, creating it if missing."""
+
+    key = _generation_key(scope, obj_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid4().hex
+        cache.set(key, generation, None)
+
+    return generation
+
+
+def _bump_generation(scope: str, obj_id: int | None):
+    """Replaces the generation token now and again after the commit,
+    in case a fragment was cached from the old data in the meantime.
+    """
+
+    if obj_id is None:
+        return
+
+    def bump():
+        get_cache().set(_generation_key(scope, obj_id), uuid4().hex, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def on_account_change(sender, instance, **kwargs):
+    """Signal receiver invalidating the fragments of an Operation's or OperationPlan's Account."""
+
+    invalidate_account(instance.account_id)
+
+
+def on_label_change(sender, instance, **kwargs):
+    """Signal receiver invalidating the fragments using a Label."""
+
+    if instance.account_id:
+        invalidate_account(instance.account_id)
+    else:
+        invalidate_home(instance.home_id)
+
+
+def on_account_created(sender, instance, created: bool = False, **kwargs):
+    """Signal receiver starting a new generation for new Accounts so their IDs cannot hit old entries."""
+
+    if created:
+        invalidate_account(instance.id)
+
+
+def on_home_created(sender, instance, created: bool = False, **kwargs):
+    """Signal receiver starting a new generation for new Homes so their IDs cannot hit old entries."""
+
+    if created:
+        invalidate_home(instance.id)
+
+
+def connect_signals():
+    """Connects the invalidation receivers to the model signals."""
+
+    from django.db.models.signals import post_delete, post_save
+    from .models import Account, Home, Label, Operation, OperationPlan
+
+    for model in (Operation, OperationPlan):
+        post_save.connect(on_account_change, sender=model, dispatch_uid=f'budget_cache_{model.__name__}_save')
+        post_delete.connect(on_account_change, sender=model, dispatch_uid=f'budget_cache_{model.__name__}_delete')
+
+    post_save.connect(on_label_change, sender=Label, dispatch_uid='budget_cache_label_save')
+    post_delete.connect(on_label_change, sender=Label, dispatch_uid='budget_cache_label_delete')
+
+    post_save.connect(on_account_created, sender=Account, dispatch_uid='budget_cache_account_created')
+    post_save.connect(on_home_created, sender=Home, dispatch_uid='budget_cache_home_created')
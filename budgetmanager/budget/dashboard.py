@@ -0,0 +1,78 @@
+from . import cache
+from .models import Account, Operation
+from .utils import today
+
+RECENT_OPERATIONS = 5
+"""Number of the most recent operations included in the dashboard data."""
+
+
+def get_etag(account: Account) -> str:
+    """Returns the ETag of the Account's dashboard data.
+    It changes with the Account's version, with the fragment cache generations (e.g. after a label
+    or a Home member is renamed) and with the date as the chart series depend on it.
+    """
+
+    return f'{account.id}-{account.version}-{cache.get_generations(account)}-{today():%Y%m%d}'
+
+
+def get_chart_data(account: Account) -> dict:
+    """Returns the compact columnar payload of the dashboard charts.
+    Its size depends on the number of labels and not on the number of operations.
+    """
+
+    label_totals = account.get_this_month_label_totals()
+
+    return {
+        'currency': account.home.currency,
+        'labels': {
+            'ids': [row[0] or 0 for row in label_totals],
+            'names': [row[1] or 'No label' for row in label_totals],
+            'income': [row[2] for row in label_totals],
+            'expenses': [row[3] for row in label_totals],
+        },
+        'months': {
+            'income': account.get_this_year_income(),
+            'expenses': account.get_this_year_expenses(),
+        },
+    }
+
+
+def serialize_operation(op: Operation) -> dict:
+    """Returns the JSON representation of an operation from `OperationQuerySet.for_list()`."""
+
+    return {
+        'id': op.id,
+        'amount': str(op.amount),
+        'description': op.description or '',
+        'label': op.label.name if op.label else None,
+        'created': op.creation_date.isoformat(),
+        'finalized': op.final_date.isoformat() if op.final_date else None,
+        'direction': op.direction,
+        'counterparty': op.get_counterparty_name(),
+    }
+
+
+def get_recent_operations(account: Account) -> list[Operation]:
+    """Returns the Account's most recent operations prepared for lists from the fragment cache."""
+
+    return cache.get_fragment('recent_operations', account,
+                              lambda: list(account.get_operation_list()[:RECENT_OPERATIONS]))
+
+
+def get_dashboard_data(account: Account) -> dict:
+    """Returns the Account's balances, recent operations and chart series.
+    The operations and the chart series are taken from the fragment cache.
+    """
+
+    operations = get_recent_operations(account)
+    charts = cache.get_fragment('chart_data', account, lambda: get_chart_data(account))
+
+    return {
+        'version': account.version,
+        'balances': {
+            'current': str(account.current_amount),
+            'final': str(account.final_amount),
+        },
+        'operations': [serialize_operation(op) for op in operations],
+        'charts': charts,
+    }
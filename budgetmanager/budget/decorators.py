@@ -1,11 +1,43 @@
-from django.contrib.auth.decorators import user_passes_test
+from functools import wraps
+
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import redirect
+
+from .middleware import get_account_context
+
 
 def home_required(redirect_url: str = None):
     """A decorator checking if the user is authenticated and has an Account and a Home."""
 
     redirect_url = redirect_url or '/'
-    
-    return user_passes_test(
-        lambda u: u.is_authenticated and hasattr(u, 'account') and hasattr(u.account, 'home'),
-        login_url=redirect_url,
-        redirect_field_name='')
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if get_account_context(request).account is None:
+                return redirect(redirect_url)
+
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def account_perm_required(perm: str):
+    """A decorator checking if the user's Account has the permission (see `Account.has_perm()`).
+    Redirects to the login page otherwise, like `permission_required`.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            account = get_account_context(request).actual_account
+            if account is None or not account.has_perm(perm):
+                return redirect_to_login(request.get_full_path())
+
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,87 @@
+import csv
+import json
+from datetime import date
+
+from django.db.models import QuerySet
+
+from .models import Account, Home, Label, Operation
+
+EXPORT_FIELDS = {
+    'id': 'id',
+    'username': 'account__user__username',
+    'creation_date': 'creation_date',
+    'final_date': 'final_date',
+    'amount': 'amount',
+    'label': 'label__name',
+    'description': 'description',
+    'plan': 'plan_id',
+    'source': 'source_id',
+}
+"""Exported column names mapped to the Operation field lookups."""
+
+CHUNK_SIZE = 2000
+"""Default number of rows fetched from the database at once."""
+
+
+def filter_operations(account: Account | None = None, home: Home | None = None, label: Label | None = None,
+                      start: date | None = None, end: date | None = None):
+    """Returns a QuerySet of the operations to export.
+
+    The operations can be limited to an Account, a Home, a Label and a creation date range (inclusive).
+    """
+
+    qset = Operation.objects.all()
+
+    if account:
+        qset = qset.filter(account=account)
+    if home:
+        qset = qset.filter(account__home=home)
+    if label:
+        qset = qset.filter(label=label)
+    if start:
+        qset = qset.filter(creation_date__gte=start)
+    if end:
+        qset = qset.filter(creation_date__lte=end)
+
+    return qset.order_by('creation_date', 'id')
+
+
+def iter_rows(qset: QuerySet, chunk_size: int = CHUNK_SIZE):
+    """Yields the exported operations as dictionaries without creating model instances.
+    Only `chunk_size` rows are held in memory at once.
+    """
+
+    lookups = list(EXPORT_FIELDS.values())
+    for values in qset.values_list(*lookups).iterator(chunk_size=chunk_size):
+        yield dict(zip(EXPORT_FIELDS.keys(), values))
+
+
+class _Echo:
+    """File-like object returning the written value instead of buffering it."""
+
+    def write(self, value: str):
+        return value
+
+
+def iter_csv(qset: QuerySet, chunk_size: int = CHUNK_SIZE):
+    """Yields the exported operations as CSV lines starting with a header."""
+
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(EXPORT_FIELDS.keys())
+    for row in iter_rows(qset, chunk_size):
+        yield writer.writerow(['' if value is None else value for value in row.values()])
+
+
+def iter_jsonl(qset: QuerySet, chunk_size: int = CHUNK_SIZE):
+    """Yields the exported operations as JSON lines."""
+
+    for row in iter_rows(qset, chunk_size):
+        yield json.dumps(row, default=str) + '\n'
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'jsonl': (iter_jsonl, 'application/jsonl'),
+}
+"""Export formats mapped to tuples of `(row generator, content type)`."""
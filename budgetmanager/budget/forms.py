@@ -8,6 +8,7 @@ from django.core.validators import MinValueValidator
 
 from .models import *
 from .utils import today
+from . import exports, transfers
 
 
 class BaseLabelForm(forms.ModelForm):
@@ -296,4 +297,132 @@ class RenameAccountForm(forms.ModelForm):
         form = cls()
         form.fields['first_name'].label = 'Name'
         form.fields['first_name'].initial = name
-        return form
\ No newline at end of file
+        return form
+
+
+class SplitTransferForm(forms.Form):
+    """Form for splitting a bill evenly between the Account and chosen Home members in one transfer."""
+
+    SEND = 'send'
+    COLLECT = 'collect'
+
+    direction = forms.ChoiceField(
+        choices=[(SEND, 'I pay the members'), (COLLECT, 'The members pay me')], initial=COLLECT, label='Direction')
+
+    amount = forms.DecimalField(max_digits=8, decimal_places=2, min_value=0.01, label='Total amount')
+
+    description = forms.CharField(max_length=500, required=False, label='Description')
+
+    members = forms.ModelMultipleChoiceField(
+        queryset=Account.objects.none(), widget=forms.widgets.CheckboxSelectMultiple, label='Members')
+
+    include_self = forms.BooleanField(initial=True, required=False, label='Include my share')
+
+    def clean(self):
+
+        cleaned_data = super().clean()
+        amount = cleaned_data.get('amount')
+        members = cleaned_data.get('members')
+
+        if amount and members and amount * 100 < self._parts(members):
+            raise ValidationError('The amount is too small to be split.')
+
+        return cleaned_data
+
+    def get_shares(self):
+        """Returns the list of `(member, amount)` pairs. The own share, if included, is left out."""
+
+        data = self.cleaned_data
+        members = list(data['members'])
+        shares = transfers.split_evenly(data['amount'], self._parts(members))
+
+        return list(zip(members, shares[-len(members):]))
+
+    def make_transfer(self, account: Account):
+        """Makes the split transfer for the Account. Returns the list of `(outcoming, incoming)` pairs."""
+
+        data = self.cleaned_data
+        if data['direction'] == self.SEND:
+            return transfers.split(account, self.get_shares(), data.get('description') or None)
+
+        return transfers.collect(account, self.get_shares(), data.get('description') or None)
+
+    def _parts(self, members):
+        """Returns the number of shares the amount is split into."""
+
+        return len(members) + (1 if self.cleaned_data.get('include_self') else 0)
+
+    @classmethod
+    def from_account(cls, account: Account, data: QueryDict | None = None):
+        """Creates a form with the member choices limited to the other Account's Home members.
+        Sending requires the `make_transactions` permission and collecting the `plan_for_others` one.
+        Returns the created form.
+        """
+
+        form = cls(data)
+        form.fields['direction'].choices = [
+            choice for choice, perm in zip(form.fields['direction'].choices,
+                                           ('budget.make_transactions', 'budget.plan_for_others'))
+            if account.has_perm(perm)]
+        form.fields['members'].queryset = Account.objects.filter(
+            home_id=account.home_id).exclude(id=account.id).select_related('user').order_by('user__username')
+        form.fields['members'].label_from_instance = Account.get_username
+        return form
+
+
+class ExportOperationsForm(forms.Form):
+    """Form for filtering the exported operations."""
+
+    format = forms.ChoiceField(choices=[(name, name.upper()) for name in exports.FORMATS],
+                               initial='csv', label='Format')
+
+    scope = forms.ChoiceField(choices=[('account', 'My operations'), ('home', 'Whole Home')],
+                              initial='account', label='Operations', required=False)
+
+    label = forms.ModelChoiceField(queryset=Label.objects.none(), required=False, label='Label')
+
+    start = forms.DateField(required=False, label='From')
+
+    end = forms.DateField(required=False, label='To')
+
+    def clean(self):
+
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+
+        if start and end and start > end:
+            raise ValidationError('The start date cannot be after the end date.')
+
+        return cleaned_data
+
+    def get_operations(self, account: Account):
+        """Returns the filtered operations QuerySet for the Account.
+        Whole Home operations are only returned if the Account's user can manage the Home.
+        """
+
+        data = self.cleaned_data
+        if data.get('scope') == 'home' and account.has_perm('budget.manage_home'):
+            filters = {'home': account.home}
+        else:
+            filters = {'account': account}
+
+        return exports.filter_operations(label=data.get('label'), start=data.get('start'),
+                                         end=data.get('end'), **filters)
+
+    @classmethod
+    def from_get(cls, account: Account, data: QueryDict):
+        """Creates a form from the GET data with the label choices updated according to the Account.
+        Returns the created form.
+        """
+
+        form = cls(data)
+        form.fields['label'].queryset = account.available_labels()
+        return form
+
+
+class ImportOperationsForm(forms.Form):
+    """Form for uploading a CSV bank statement."""
+
+    file = forms.FileField(label='CSV file',
+                           help_text='Columns: date (YYYY-MM-DD), amount, description and label (optional).')
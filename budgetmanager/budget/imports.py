@@ -0,0 +1,142 @@
+import csv
+import decimal
+import hashlib
+from datetime import date
+from itertools import islice
+from typing import Iterable
+
+from django.db import transaction
+
+from .models import Account, MonthlySummary, Operation
+
+BATCH_SIZE = 500
+"""Default number of rows validated and inserted at once."""
+
+MAX_ERRORS = 20
+"""Maximum number of row errors kept in the import result."""
+
+
+class ImportResult:
+    """Summary of a finished import."""
+
+    def __init__(self):
+        self.created = 0
+        """Number of created operations."""
+
+        self.duplicates = 0
+        """Number of skipped rows that were already imported or repeated in the file."""
+
+        self.invalid = 0
+        """Number of skipped invalid rows."""
+
+        self.errors = []
+        """List of `(line number, message)` tuples describing the first invalid rows."""
+
+    def __str__(self):
+        return f'Imported {self.created} operation(s), skipped {self.duplicates} duplicate(s) and {self.invalid} invalid row(s).'
+
+
+def operation_hash(account_id: int, day: date, amount: decimal.Decimal, description: str):
+    """Returns the deduplication hash of an imported operation."""
+
+    key = f'{account_id}|{day.isoformat()}|{amount}|{description}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def import_operations(account: Account, lines: Iterable[str], batch_size: int = BATCH_SIZE):
+    """Imports finalized operations from CSV lines with the `date`, `amount`, `description` and `label` columns.
+    The `description` and `label` columns are optional. The label is matched by name with the Account's labels.
+
+    The lines are read and validated in batches. Rows that were already imported (same account, date, amount
+    and description) are skipped. The operations are inserted with `bulk_create` and the Account amounts
+    and monthly summaries are updated once at the end, everything in a single transaction.
+
+    Returns an ImportResult.
+    """
+
+    result = ImportResult()
+    labels = {label.name.lower(): label.id for label in account.available_labels()}
+    reader = csv.DictReader(lines)
+    # Every row is paired with its line number as `reader.line_num` moves on while a batch is read
+    rows = ((reader.line_num, row) for row in reader)
+
+    seen = set()
+    total = decimal.Decimal('0.00')
+    summaries = {}
+
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            operations = {}
+            for line_num, row in batch:
+                try:
+                    op = _parse_row(account, row, labels)
+                except ValueError as e:
+                    result.invalid += 1
+                    if len(result.errors) < MAX_ERRORS:
+                        result.errors.append((line_num, str(e)))
+                    continue
+
+                if op.import_hash in seen or op.import_hash in operations:
+                    result.duplicates += 1
+                else:
+                    operations[op.import_hash] = op
+
+            existing = set(Operation.objects.filter(account=account).filter(
+                import_hash__in=operations.keys()).values_list('import_hash', flat=True))
+            result.duplicates += len(existing)
+
+            new_ops = [op for key, op in operations.items() if key not in existing]
+            Operation.objects.bulk_create(new_ops)
+
+            seen.update(operations.keys())
+            result.created += len(new_ops)
+
+            for op in new_ops:
+                total += op.amount
+                key = (op.label_id, op.final_date.replace(day=1))
+                income, expenses = summaries.get(key, (0, 0))
+                if op.amount > 0:
+                    summaries[key] = (income + op.amount, expenses)
+                else:
+                    summaries[key] = (income, expenses - op.amount)
+
+        if result.created:
+            account.apply_amounts(final=total, current=total)
+
+        for (label_id, month), (income, expenses) in summaries.items():
+            MonthlySummary.record(account.id, label_id, month, income=income, expenses=expenses)
+
+    return result
+
+
+def _parse_row(account: Account, row: dict, labels: dict):
+    """Validates a CSV row and returns an unsaved finalized Operation.
+    Raises ValueError if the row is invalid.
+    """
+
+    try:
+        day = date.fromisoformat((row.get('date') or '').strip())
+    except ValueError:
+        raise ValueError('Invalid date.')
+
+    try:
+        amount = decimal.Decimal((row.get('amount') or '').strip()).quantize(decimal.Decimal('0.01'))
+    except decimal.InvalidOperation:
+        raise ValueError('Invalid amount.')
+
+    if not amount.is_finite() or abs(amount) > Account.MAX_AMOUNT:
+        raise ValueError('Invalid amount.')
+
+    description = (row.get('description') or '').strip()[:500] or None
+
+    label_name = (row.get('label') or '').strip().lower()
+    if label_name and label_name not in labels:
+        raise ValueError(f'Unknown label "{label_name}".')
+
+    return Operation(account=account, amount=amount, description=description, final_date=day,
+                     label_id=labels.get(label_name),
+                     import_hash=operation_hash(account.id, day, amount, description or ''))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from budget import profiling
+
+
+class ProfiledCommand(BaseCommand):
+    """Base command with the `--profile` option sampling the command's stacks (see `budget.profiling`)."""
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Sample the stacks of the command and write them to a collapsed stack file.'
+        )
+        self._name = subcommand
+        return parser
+
+    def execute(self, *args, **options):
+        if not options.get('profile'):
+            return super().execute(*args, **options)
+
+        sampler = profiling.Sampler()
+        if not sampler.start():
+            self.stderr.write('Another profile is running, the command is not profiled.')
+            return super().execute(*args, **options)
+
+        try:
+            return super().execute(*args, **options)
+        finally:
+            sampler.stop()
+            path = sampler.write(self._name)
+            self.stderr.write(f'Profile of {sampler.samples} sample(s) written to {path}.')
@@ -0,0 +1,111 @@
+import json
+
+from django.core.management.base import CommandError
+from django.db import connection
+
+from budget import benchmarks
+from budget.models import Account
+from budget.utils import today
+
+from ._private import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    help = 'Times the hot paths (views, planoperations, recalculate_amounts, make_transaction) ' \
+        'and reports p50/p95 latency and query counts as JSON.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '-u', '--username',
+            help='Account to benchmark. Defaults to the seeded Home Admin with the most operations.'
+        )
+        parser.add_argument(
+            '-n', '--iterations',
+            type=int,
+            default=20,
+            help='Number of timed runs of every scenario.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Number of untimed runs of every scenario.'
+        )
+        parser.add_argument(
+            '-s', '--scenario',
+            action='append',
+            help='Scenario to run (can be repeated). All scenarios are run by default.'
+        )
+        parser.add_argument(
+            '-o', '--output',
+            help='Path of the JSON results file. The results are written to stdout by default.'
+        )
+        parser.add_argument(
+            '-b', '--baseline',
+            help='Path of a previous results file to compare with.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=1.2,
+            help='Allowed ratio of the p50 latency to the baseline one.'
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Exit with an error if a regression against the baseline is found.'
+        )
+
+    def handle(self, *args, **options):
+
+        try:
+            account = benchmarks.find_account(options['username'])
+        except Account.DoesNotExist:
+            raise CommandError(f'Account "{options["username"]}" does not exist.')
+        if account is None:
+            raise CommandError('No seeded data found. Run seedbudget first or pass --username.')
+
+        if options['iterations'] < 1:
+            raise CommandError('The number of iterations must be positive.')
+
+        benchmark = benchmarks.Benchmark(account, iterations=options['iterations'], warmup=options['warmup'])
+        unknown = set(options['scenario'] or []) - set(benchmark.scenarios())
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}.')
+
+        results = benchmark.run(options['scenario'])
+
+        meta = {
+            'username': account.user.username,
+            'operations': account.get_operations().count(),
+            'iterations': options['iterations'],
+            'vendor': connection.vendor,
+            'date': today().isoformat(),
+        }
+        output = benchmarks.dump(results, meta)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            self._compare(results, options)
+
+    def _compare(self, results: dict, options: dict):
+        """Compares the results with the baseline file and reports the regressions."""
+
+        with open(options['baseline']) as file:
+            baseline = json.load(file)['results']
+
+        regressions = benchmarks.compare(results, baseline, options['threshold'])
+        for regression in regressions:
+            self.stderr.write(self.style.WARNING(regression))
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} regression(s) found.')
+
+        if not regressions:
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,131 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+
+from budget import transfers
+from budget.models import Account, Home
+
+from ._private import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    help = 'Measures the throughput of concurrent transfers between the accounts of a temporary Home.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '-a', '--accounts',
+            type=int,
+            default=4,
+            help='Number of accounts in the Home.'
+        )
+        parser.add_argument(
+            '-t', '--threads',
+            type=int,
+            default=8,
+            help='Number of concurrent threads.'
+        )
+        parser.add_argument(
+            '-n', '--transfers',
+            type=int,
+            default=100,
+            help='Number of transfers made by each thread.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed of the random transfer generator.'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Do not remove the benchmark Home afterwards.'
+        )
+
+    def handle(self, *args, **options):
+
+        if not 2 <= options['accounts'] <= Home.MAX_ACCOUNTS:
+            raise CommandError(f'The number of accounts must be between 2 and {Home.MAX_ACCOUNTS}.')
+
+        home = self._create_home(options['accounts'])
+        account_ids = list(Account.objects.filter(home=home).values_list('id', flat=True))
+        self.retries = 0
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                futures = [executor.submit(self._run, account_ids, options['transfers'], options['seed'] + i)
+                           for i in range(options['threads'])]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - start
+
+            self._check(home)
+        finally:
+            if not options['keep']:
+                home.remove()
+
+        total = options['threads'] * options['transfers']
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} transfers in {elapsed:.2f}s ({total / elapsed:.1f}/s), {self.retries} retried.'))
+
+    def _create_home(self, accounts: int):
+        """Creates a temporary Home with the specified number of accounts."""
+
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        admin = User(username=f'{prefix}-0')
+        admin.set_unusable_password()
+        admin.save()
+        home = Home.create_home(home_name=prefix, user=admin, currency=Home.Currency.PLN)
+
+        for i in range(1, accounts):
+            user = User(username=f'{prefix}-{i}')
+            user.set_unusable_password()
+            user.save()
+            Account(user=user, home=home).save()
+
+        return home
+
+    def _run(self, account_ids: list[int], count: int, seed: int):
+        """Makes random transfers between the accounts. Runs in a separate thread."""
+
+        rand = random.Random(seed)
+        try:
+            for _ in range(count):
+                source_id, destination_id = rand.sample(account_ids, 2)
+                amount = rand.randint(1, 10000) / 100
+                self._retry_locked(lambda: transfers.transfer(
+                    Account.objects.get(id=source_id), Account.objects.get(id=destination_id), amount))
+        finally:
+            connection.close()
+
+    def _retry_locked(self, func):
+        """Calls the function retrying when the database is locked.
+        SQLite allows only one writer at a time and reports the conflict instead of waiting.
+        """
+
+        while True:
+            try:
+                return func()
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                self.retries += 1
+                time.sleep(0.001)
+
+    def _check(self, home: Home):
+        """Checks if no money was created or lost and if the balances match the operations."""
+
+        accounts = list(Account.objects.filter(home=home))
+        if sum(account.final_amount for account in accounts) != 0:
+            raise CommandError('The total balance of the Home changed.')
+
+        for account in accounts:
+            if account.final_amount != account.calculate_final():
+                raise CommandError(f'The balance of "{account}" does not match its operations.')
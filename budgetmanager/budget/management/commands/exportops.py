@@ -0,0 +1,81 @@
+from datetime import date
+
+from django.core.management.base import CommandError
+
+from budget import exports
+from budget.models import Account, Home, Label
+
+from ._private import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    help = 'Streams the operation history to a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '-a', '--account',
+            help='Username of the exported account.'
+        )
+        parser.add_argument(
+            '--home',
+            type=int,
+            help='Id of the exported Home.'
+        )
+        parser.add_argument(
+            '-l', '--label',
+            type=int,
+            help='Id of the exported label.'
+        )
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            help='First creation date (YYYY-MM-DD) of the exported operations.'
+        )
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            help='Last creation date (YYYY-MM-DD) of the exported operations.'
+        )
+        parser.add_argument(
+            '-f', '--format',
+            choices=exports.FORMATS.keys(),
+            default='csv',
+            help='Export format.'
+        )
+        parser.add_argument(
+            '-o', '--output',
+            help='Output file path. The standard output is used if not specified.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=exports.CHUNK_SIZE,
+            help='Number of rows fetched from the database at once.'
+        )
+
+    def handle(self, *args, **options):
+
+        try:
+            account = Account.objects.get(
+                user__username=options['account']) if options['account'] else None
+            home = Home.objects.get(id=options['home']) if options['home'] else None
+            label = Label.objects.get(id=options['label']) if options['label'] else None
+        except (Account.DoesNotExist, Home.DoesNotExist, Label.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        qset = exports.filter_operations(account=account, home=home, label=label,
+                                         start=options['start'], end=options['end'])
+        rows, _ = exports.FORMATS[options['format']]
+
+        lines = rows(qset, chunk_size=options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', newline='') as file:
+            file.writelines(lines)
+
+        self.stderr.write(self.style.SUCCESS(f'Exported operations to {options["output"]}.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import CommandError
+
+from budget import imports
+from budget.models import Account
+
+from ._private import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    help = 'Imports finalized operations for an account from a CSV bank statement.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('username', help='Username of the account.')
+        parser.add_argument('path', help='Path of the CSV file.')
+        parser.add_argument(
+            '-b', '--batch-size',
+            type=int,
+            default=imports.BATCH_SIZE,
+            help='Number of rows validated and inserted at once.'
+        )
+
+    def handle(self, *args, **options):
+
+        try:
+            account = Account.objects.select_related('home').get(user__username=options['username'])
+        except Account.DoesNotExist:
+            raise CommandError(f'Account "{options["username"]}" does not exist.')
+
+        with open(options['path'], newline='', encoding='utf-8-sig') as file:
+            result = imports.import_operations(account, file, batch_size=options['batch_size'])
+
+        for line, error in result.errors:
+            self.stderr.write(self.style.WARNING(f'Line {line}: {error}'))
+
+        self.stdout.write(self.style.SUCCESS(str(result)))
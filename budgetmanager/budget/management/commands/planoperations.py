@@ -1,23 +1,42 @@
-from django.core.management.base import BaseCommand, CommandError
+import time
 
-from budget.models import OperationPlan
+from django.core.management.base import CommandError
+
+from budget import metrics
+from budget.models import Account, OperationPlan
 from budget.utils import today
 
-class Command(BaseCommand):
-    help = 'Creates all operations from plans that are due.'
+from ._private import ProfiledCommand
+
+class Command(ProfiledCommand):
+    help = 'Creates all operations from plans that are due. Meant to be run periodically in the background.'
 
     def handle(self, *args, **options):
+        start = time.perf_counter()
         counter = 0
-        qset = OperationPlan.objects.filter(next_date__lte=today())
+        plan_counter = 0
+        error_counter = 0
+
+        # Accounts whose plans were created without setting the watermark (e.g. before it existed)
+        synced = Account.sync_next_plan_dates(
+            next_plan_date=None, id__in=OperationPlan.objects.values('account_id'))
+        if synced:
+            self.stdout.write(f'Set the next plan date of {synced} account(s).')
 
-        for plan in qset:
+        qset = Account.objects.filter(
+            next_plan_date__lte=today()).select_related('user')
+
+        for account in qset:
             try:
-                while plan.is_due():
-                    plan.create_operation()
-                    counter += 1
-            except:
+                plans, ops = account.materialize_plans()
+                counter += len(ops)
+                plan_counter += len(plans)
+            except Exception:
+                error_counter += 1
                 self.stderr.write(self.style.ERROR(
-                    f'Error creating operation from plan id: {plan.id}.'))
+                    f'Error creating operations from plans of account id: {account.id}.'))
+
+        metrics.record_plan_run(counter, plan_counter, error_counter, time.perf_counter() - start)
 
         self.stdout.write(self.style.SUCCESS(
-            f'Created {counter} operation(s) from {qset.count()} plans.'))
+            f'Created {counter} operation(s) from {plan_counter} plans.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import CommandError
+
+from budget.models import MonthlySummary
+
+from ._private import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    help = 'Rebuilds the monthly operation summaries from scratch and checks them against the raw operations.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '-c', '--check',
+            action='store_true',
+            help='Only check the summaries without rebuilding them.'
+        )
+
+    def handle(self, *args, **options):
+
+        if not options['check']:
+            MonthlySummary.rebuild()
+            self.stdout.write(
+                f'Rebuilt {MonthlySummary.objects.count()} monthly summaries.')
+
+        mismatches = MonthlySummary.verify()
+        for account_id, label_id, month in mismatches:
+            self.stderr.write(self.style.ERROR(
+                f'Summary mismatch for account id: {account_id}, label id: {label_id}, month: {month:%Y-%m}.'))
+
+        if mismatches:
+            raise CommandError(f'Found {len(mismatches)} inconsistent monthly summaries.')
+
+        self.stdout.write(self.style.SUCCESS('Monthly summaries are consistent.'))
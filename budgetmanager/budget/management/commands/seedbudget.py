@@ -0,0 +1,72 @@
+from django.core.management.base import CommandError
+
+from budget.benchmarks import Seeder
+
+from ._private import ProfiledCommand
+
+
+class Command(ProfiledCommand):
+    help = 'Generates deterministic synthetic Homes, accounts, operations and plans for benchmarking.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--homes',
+            type=int,
+            default=10,
+            help='Number of Homes.'
+        )
+        parser.add_argument(
+            '--accounts',
+            type=int,
+            default=4,
+            help='Number of accounts in every Home (at most Home.MAX_ACCOUNTS).'
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=500,
+            help='Number of operations of every account.'
+        )
+        parser.add_argument(
+            '--plans',
+            type=int,
+            default=3,
+            help='Number of operation plans of every account.'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Number of past days the operations are spread over.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed. The same seed always generates the same data.'
+        )
+        parser.add_argument(
+            '-c', '--clear',
+            action='store_true',
+            help='Remove the data previously generated with the same seed first.'
+        )
+
+    def handle(self, *args, **options):
+
+        if min(options['homes'], options['accounts'], options['days']) < 1:
+            raise CommandError('The numbers of homes, accounts and days must be positive.')
+
+        seeder = Seeder(options['homes'], options['accounts'], options['operations'], options['plans'],
+                        seed=options['seed'], days=options['days'])
+
+        if seeder.exists():
+            if not options['clear']:
+                raise CommandError(f'Data with seed {options["seed"]} already exists. Use --clear to replace it.')
+            seeder.clear()
+
+        counts = seeder.run()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Created {homes} home(s), {accounts} account(s), {operations} operation(s) and {plans} plan(s).'.format(
+                **counts)))
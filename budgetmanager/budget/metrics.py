@@ -0,0 +1,244 @@
+import bisect
+from threading import Lock
+from typing import Callable, Iterable
+
+from . import cache
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+"""Content type of the Prometheus text exposition format."""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Upper bounds (in seconds) of the request latency histogram buckets."""
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+"""Upper bounds of the queries per request histogram buckets."""
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class of the metrics. The values are kept per tuple of label values."""
+
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'Metric {self.name} expects labels {self.labelnames}.')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, **extra) -> dict:
+        return dict(zip(self.labelnames, key)) | extra
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        """Returns the `(name, labels, value)` samples of the metric."""
+
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        lines += [f'{name}{_format_labels(labels)} {_format_value(value)}' for name, labels, value in self.samples()]
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', self._labels(key, le=_format_value(bound)), cumulative))
+                samples.append((f'{self.name}_sum', self._labels(key), total))
+                samples.append((f'{self.name}_count', self._labels(key), cumulative))
+
+        return samples
+
+
+class MetricsRegistry:
+    """Thread-safe collection of the metrics of this process.
+    Collectors are called on every render and return metrics computed from other sources.
+
+    The registered metrics are kept in memory, so with multiple worker processes each worker
+    reports only the requests it handled. The collected metrics come from shared storage
+    (the database) and are the same in every worker.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], Iterable[Metric]]] = []
+        self._lock = Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered.')
+            self._metrics[metric.name] = metric
+
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def clear(self):
+        """Resets the values of all the registered metrics."""
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        """Returns all the metrics in the Prometheus text format."""
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            metrics.extend(collector())
+
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+metrics = MetricsRegistry()
+"""The metrics of the whole process."""
+
+REQUEST_DURATION = metrics.register(Histogram(
+    'budget_request_duration_seconds', 'Request latency per view and action.', ['view']))
+
+REQUEST_QUERIES = metrics.register(Histogram(
+    'budget_request_queries', 'Number of SQL queries per request.', ['view'], buckets=QUERY_BUCKETS))
+
+REQUESTS = metrics.register(Counter(
+    'budget_requests_total', 'Number of handled requests per view, action and status code.', ['view', 'status']))
+
+BALANCE_RECALCULATIONS = metrics.register(Counter(
+    'budget_balance_recalculations_total', 'Number of Account balances recalculated from all the operations.'))
+
+BALANCE_UPDATES = metrics.register(Counter(
+    'budget_balance_updates_total', 'Number of incremental Account balance updates.'))
+
+
+def observe_request(timings, status: int):
+    """Records the timings of a handled request (see `timing.RequestTimings`)."""
+
+    view = timings.name or 'unresolved'
+    REQUEST_DURATION.observe(timings.total / 1000, view=view)
+    REQUEST_QUERIES.observe(timings.queries, view=view)
+    REQUESTS.inc(view=view, status=status)
+
+
+def record_plan_run(operations: int, plans: int, errors: int, duration: float):
+    """Records a `planoperations` run in the database, so it is reported by the web processes."""
+
+    from .models import PlanRun
+
+    PlanRun.objects.create(operations=operations, plans=plans, errors=errors, duration=duration)
+
+
+def _collect_plan_runs():
+    from .models import PlanRun
+
+    last = PlanRun.objects.first()
+    if last is None:
+        return []
+
+    totals = PlanRun.totals()
+    counters = [
+        ('budget_planoperations_runs_total', 'Number of planoperations runs.', totals['runs']),
+        ('budget_planoperations_operations_total', 'Operations created from plans.', totals['operations']),
+        ('budget_planoperations_plans_total', 'Plans processed.', totals['plans']),
+        ('budget_planoperations_errors_total', 'Accounts whose plans failed to materialize.', totals['errors']),
+        ('budget_planoperations_duration_seconds_total', 'Total duration of the runs.', totals['duration']),
+    ]
+    gauges = [
+        ('budget_planoperations_last_operations', 'Operations created by the last run.', last.operations),
+        ('budget_planoperations_last_duration_seconds', 'Duration of the last run.', last.duration),
+        ('budget_planoperations_last_run_timestamp_seconds', 'Time of the last run.', last.time.timestamp()),
+    ]
+
+    collected = []
+    for name, help, value in counters:
+        collected.append(Counter(name, help))
+        collected[-1].inc(value)
+    for name, help, value in gauges:
+        collected.append(Gauge(name, help))
+        collected[-1].set(value)
+
+    return collected
+
+
+def _collect_fragment_cache():
+    hits = Counter('budget_fragment_cache_hits_total', 'Fragment cache hits per fragment.', ['fragment'])
+    misses = Counter('budget_fragment_cache_misses_total', 'Fragment cache misses per fragment.', ['fragment'])
+    ratio = Gauge('budget_fragment_cache_hit_ratio', 'Fragment cache hit ratio per fragment.', ['fragment'])
+
+    for name, counts in cache.stats().items():
+        hits.inc(counts['hits'], fragment=name)
+        misses.inc(counts['misses'], fragment=name)
+        ratio.set(counts['hits'] / ((counts['hits'] + counts['misses']) or 1), fragment=name)
+
+    return [hits, misses, ratio]
+
+
+metrics.add_collector(_collect_plan_runs)
+metrics.add_collector(_collect_fragment_cache)
@@ -0,0 +1,187 @@
+import os
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
+from django.http.request import HttpRequest
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics, profiling, roles, timing
+from .models import Account, MOD_GROUP
+
+
+class AccountContext:
+    """The effective user of a request with their Account, Home and roles."""
+
+    def __init__(self, user, account: Account | None = None, actual_account: Account | None = None):
+        self.user = user
+        self.account = account
+        self.home = account.home if account else None
+        self.actual_account = actual_account or account
+
+        self.is_admin = account is not None and self.home.admin_id == account.id
+        self.is_mod = account is not None and account.in_mod_group
+
+        if account is not None:
+            roles.remember(self.home.id, self.home.roles_version)
+
+    @property
+    def is_view_as(self) -> bool:
+        """Checks if the request is performed as another user."""
+
+        return self.account is not self.actual_account
+
+    @classmethod
+    def load(cls, request: HttpRequest):
+        """Loads the accounts of the user and of the viewed user (if any) in a single query."""
+
+        user = request.user
+        if not user.is_authenticated:
+            return cls(user)
+
+        view_as = request.session.get('view_as')
+        lookup = Q(user_id=user.id)
+        if view_as:
+            lookup |= Q(user__username=view_as)
+
+        accounts = Account.objects.select_related('user', 'home').filter(lookup).annotate(
+            in_mod_group=Exists(User.groups.through.objects.filter(
+                user_id=OuterRef('user_id'), group__name=MOD_GROUP)))
+
+        own = viewed = None
+        for account in accounts:
+            if account.user_id == user.id:
+                own = account
+            else:
+                viewed = account
+
+        if own is None:
+            return cls(user)
+
+        # Share the authenticated user instance so its permission cache is reused
+        own.user = user
+
+        if viewed is None or viewed.home_id != own.home_id:
+            return cls(user, own)
+
+        viewed.home = own.home
+        return cls(viewed.user, viewed, own)
+
+
+def get_account_context(request: HttpRequest) -> AccountContext:
+    """Returns the account context of the request, loading it on first use."""
+
+    context = getattr(request, 'account_context', None)
+    if context is None:
+        context = AccountContext.load(request)
+        request.account_context = context
+
+    return context
+
+
+def reset_account_context(request: HttpRequest):
+    """Drops the cached account context, e.g. after the view as session changes."""
+
+    request.account_context = SimpleLazyObject(lambda: AccountContext.load(request))
+
+
+class AccountContextMiddleware:
+    """Attaches a lazily loaded `AccountContext` to every request as `request.account_context`.
+    The roles of a Home are resolved at most once per request (see `roles.activate()`).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        reset_account_context(request)
+
+        token = roles.activate()
+        try:
+            return self.get_response(request)
+        finally:
+            roles.deactivate(token)
+
+
+class RequestTimingMiddleware:
+    """Records the number and time of SQL queries and the template, view and total time of every request.
+
+    With the `BUDGET_TIMING` setting the timings are logged to the `budget.timing` logger, with the slowest
+    queries above the `BUDGET_SLOW_QUERY_MS` threshold and their plans, and added in the `Server-Timing`
+    header of the responses to staff users. With the `BUDGET_METRICS` setting they are recorded in the metrics (see `metrics.py`).
+
+    The template time requires the `TimedDjangoTemplates` backend.
+    Queries made while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.report = getattr(settings, 'BUDGET_TIMING', False)
+        self.record = getattr(settings, 'BUDGET_METRICS', False)
+        if not self.report and not self.record:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.slow_query_ms = getattr(settings, 'BUDGET_SLOW_QUERY_MS', 100) if self.report else float('inf')
+
+    def __call__(self, request: HttpRequest):
+        timings = timing.RequestTimings(self.slow_query_ms)
+        token = timing.activate(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.record_query))
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+
+        timings.finish()
+        if self.report:
+            # The timings reveal the server's internals, so only staff users get them
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                response['Server-Timing'] = timings.server_timing()
+            timing.log(request, response, timings)
+        if self.record:
+            metrics.observe_request(timings, response.status_code)
+
+        return response
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs):
+        timings = timing.get_current()
+        if timings is not None:
+            timings.start_view(request, view_func)
+
+
+class ProfilingMiddleware:
+    """Samples the stacks of requests made by staff users with the `profile` query parameter
+    or the `X-Budget-Profile` header and writes them to a collapsed stack file (see `profiling.py`).
+    The file name is returned in the `X-Budget-Profile` response header.
+
+    Enabled by the `BUDGET_PROFILING` setting. Must be placed after the `AuthenticationMiddleware`.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'BUDGET_PROFILING', False):
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        if not profiling.is_requested(request):
+            return self.get_response(request)
+
+        sampler = profiling.Sampler()
+        if not sampler.start():
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        path = sampler.write(f'{request.method} {request.path}')
+        response['X-Budget-Profile'] = os.path.basename(path)
+        return response
@@ -1,11 +1,16 @@
 from datetime import date, datetime, timedelta
 from django.db import models, IntegrityError, transaction
+from django.db.models import Case, Exists, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round, TruncMonth
 from django.db.models.query_utils import Q
 from django.contrib.auth.models import Permission, Group, User
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MaxValueValidator, MinValueValidator
 import decimal
+from uuid import uuid4
 
+from . import cache, metrics, roles
+from .registry import registry
 from .utils import today
 
 ADMIN_GROUP = 'home_admin'
@@ -86,6 +91,9 @@ class Home(ConvenienceModel):
         choices=Currency.choices, max_length=5, verbose_name='Home currency')
     """Home currency for all Accounts."""
 
+    roles_version = models.UUIDField(default=uuid4, editable=False, verbose_name='Roles version')
+    """Changed whenever the roles of the Home's Accounts change. Part of the roles cache key (see `roles.get_roles()`)."""
+
     MAX_ACCOUNTS = 12
     """Maximum number of users in one Home."""
 
@@ -95,6 +103,14 @@ class Home(ConvenienceModel):
     def __str__(self):
         return self.name
 
+    def save(self, force_insert: bool = False, force_update: bool = False, using=None, update_fields=None):
+        if not self._state.adding and update_fields is None:
+            # Do not restore an outdated roles version (see `roles.invalidate()`)
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name != 'roles_version']
+
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
     @staticmethod
     def create_home(home_name: str, user: User, currency: str):
         """The method used to create a new home and add the administrator User passed as a parameter."""
@@ -167,9 +183,7 @@ class Home(ConvenienceModel):
     def change_admin(self, account: 'Account'):
         """Changes the Home Admin removing the old one if present. Also grants Moderator permissions."""
 
-        group, created = Group.objects.get_or_create(name=ADMIN_GROUP)
-        if created:
-            Home._setup_admin_group(group)
+        group = Home.get_group_id(ADMIN_GROUP)
 
         prev_admin = self.admin
         if prev_admin:
@@ -185,15 +199,13 @@ class Home(ConvenienceModel):
 
         self.admin = account
         self.save()
+        roles.invalidate(self.id)
 
     def add_mod(self, account: 'Account', commit: bool = True):
         """Adds a Home moderator."""
 
-        group, created = Group.objects.get_or_create(name=MOD_GROUP)
-        if created:
-            Home._setup_mod_group(group)
-
-        account.user.groups.add(group)
+        account.user.groups.add(Home.get_group_id(MOD_GROUP))
+        roles.invalidate(self.id)
 
         if commit:
             account.user.save()
@@ -203,22 +215,41 @@ class Home(ConvenienceModel):
         Saves the Account instance if `commit` is True.
         """
 
-        group = Group.objects.get(name=MOD_GROUP)
-
         if account.is_mod():
-            account.user.groups.remove(group)
+            account.user.groups.remove(Home.get_group_id(MOD_GROUP))
 
         account.user.user_permissions.clear()
+        roles.invalidate(self.id)
 
         if commit:
             account.user.save()
 
+    @staticmethod
+    def get_group_id(name: str):
+        """Returns the ID of the Admin or Moderator group from the registry.
+        The group is created and set up on first use.
+        """
+
+        return registry.get(('group', name), lambda: Home._init_group(name))
+
+    @staticmethod
+    def _init_group(name: str):
+        """Creates the Admin or Moderator group if needed and returns its ID."""
+
+        group, created = Group.objects.get_or_create(name=name)
+        if created:
+            if name == ADMIN_GROUP:
+                Home._setup_admin_group(group)
+            else:
+                Home._setup_mod_group(group)
+
+        return group.id
+
     @staticmethod
     def _setup_admin_group(group: Group):
         """Sets up the Home Admin group permissions."""
 
-        admin_perms = [Permission.objects.get_or_create(
-            codename=perm[0])[0] for perm in BASE_ADMIN_PERMS]
+        admin_perms = [Account.get_permission_id(perm[0]) for perm in BASE_ADMIN_PERMS]
 
         group.permissions.add(*admin_perms)
         group.save()
@@ -227,13 +258,43 @@ class Home(ConvenienceModel):
     def _setup_mod_group(group: Group):
         """Sets up the Home Moderator group permissions."""
 
-        mod_perms = [Permission.objects.get_or_create(
-            codename=perm[0])[0] for perm in BASE_MOD_PERMS]
+        mod_perms = [Account.get_permission_id(perm[0]) for perm in BASE_MOD_PERMS]
 
         group.permissions.add(*mod_perms)
         group.save()
 
 
+class AccountQuerySet(models.QuerySet):
+    """Custom Account QuerySet."""
+
+    def for_roster(self):
+        """Returns the accounts prepared for rendering the Home roster with a single query.
+
+        The users are fetched in the same query and the accounts are annotated with:
+        - `role` - 'admin', 'mod' or an empty string,
+        - `month_income` and `month_expenses` - this month's totals from the monthly summaries.
+        """
+
+        td = today()
+        summaries = MonthlySummary.objects.filter(
+            account=OuterRef('pk'), month=date(year=td.year, month=td.month, day=1)).values('account')
+
+        def month_total(field: str):
+            total = summaries.annotate(total=Sum(field)).values('total')
+            return Coalesce(Subquery(total), Value(decimal.Decimal(0)), output_field=models.DecimalField())
+
+        is_mod = Exists(User.groups.through.objects.filter(
+            user_id=OuterRef('user_id'), group_id=Home.get_group_id(MOD_GROUP)))
+
+        return self.select_related('user').annotate(
+            role=Case(
+                When(home__admin=F('pk'), then=Value('admin')),
+                When(is_mod, then=Value('mod')),
+                default=Value(''), output_field=models.CharField()),
+            month_income=month_total('income'),
+            month_expenses=month_total('expenses'))
+
+
 class Account(ConvenienceModel):
     """The model of the user account."""
 
@@ -241,6 +302,9 @@ class Account(ConvenienceModel):
         permissions = {
             ('manage_users', 'Can manage user accounts.'),
         }
+        indexes = [
+            models.Index(fields=['next_plan_date'], name='account_next_plan_idx'),
+        ]
 
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, verbose_name="User")
@@ -253,6 +317,9 @@ class Account(ConvenienceModel):
     MAX_AMOUNT = decimal.Decimal('999999.99')
     """Maximum value for an Account's amount."""
 
+    CONCURRENT_FIELDS = ('final_amount', 'current_amount', 'version')
+    """Fields updated atomically in the database which `save()` does not write unless they are in `update_fields`."""
+
     current_amount = models.DecimalField(
         decimal_places=2, max_digits=8, default=0.0, verbose_name='Current amount of money')
     """Current amount of money that the account has."""
@@ -261,15 +328,36 @@ class Account(ConvenienceModel):
         decimal_places=2, max_digits=8, default=0.0, verbose_name='Final amount of money')
     """Amount of money after all the operations are finalized."""
 
+    next_plan_date = models.DateField(
+        null=True, blank=True, verbose_name='Next planned operation date')
+    """The earliest `next_date` of the Account's operation plans or None if there are no plans.
+    All the plans are materialized through the day before it.
+    """
+
+    version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Data version')
+    """Counter increased by every change of the Account's operations, plans or labels.
+    It is only changed with `F()` updates and is not written by `save()`.
+    """
+
     MAX_LABELS = 6
     """Maximum number of labels that can be created for a user."""
 
+    objects = AccountQuerySet.as_manager()
+
     def __str__(self):
         return self.user.username
 
     def save(self, force_insert: bool = False, force_update: bool = False, using=None, update_fields=None):
         self.user.save()
 
+        if self._state.adding:
+            roles.invalidate(self.home_id)
+        elif update_fields is None:
+            # Do not overwrite the amounts and version changed concurrently by others (see `apply_amounts()`).
+            # The amounts are only written when passed explicitly, e.g. by `recalculate_amounts()`.
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name not in self.CONCURRENT_FIELDS]
+
         try:
             with transaction.atomic():
                 super().save(force_insert=force_insert, force_update=force_update,
@@ -291,13 +379,7 @@ class Account(ConvenienceModel):
     def calculate_final(self):
         """Used to calculate the finalized amount of money in the account including finalized operations."""
 
-        operations = Operation.objects.filter(account=self)
-        total = 0.0
-
-        for op in operations:
-            total += float(op.amount)
-
-        return total
+        return self._sum_operations()['final']
 
     def get_username(self):
         """Shows the user's username or first name if exists."""
@@ -314,52 +396,74 @@ class Account(ConvenienceModel):
     def calculate_current(self):
         """Used to calculate the current amount of money excluding unfinalized operations."""
 
-        operations = Operation.objects.filter(
-            account=self).exclude(final_date=None)
-        total = 0.0
+        return self._sum_operations()['current']
 
-        for op in operations:
-            total += float(op.amount)
+    def _sum_operations(self):
+        """Sums the Account's operation amounts in the database with a single query.
+
+        Returns a dictionary with exact `Decimal` values under the `final` (all operations)
+        and `current` (finalized operations only) keys.
+        The amounts are summed as integer cents as some backends (SQLite) store decimals as floats.
+        """
 
-        return total
+        cents = Cast(Round(F('amount') * 100), output_field=models.BigIntegerField())
+
+        totals = Operation.objects.filter(account=self).aggregate(
+            final=Coalesce(Sum(cents), 0),
+            current=Coalesce(Sum(cents, filter=Q(final_date__isnull=False)), 0))
+
+        return {key: decimal.Decimal(value).scaleb(-2) for key, value in totals.items()}
 
     def get_this_year_income(self):
         """Returns this year's income as a list."""
 
+        return self._get_this_year_totals('income')
+
+    def get_this_year_expenses(self):
+        """Returns this year's expenses as a list."""
+
+        return self._get_this_year_totals('expenses')
+
+    def _get_this_year_totals(self, field: str):
+        """Returns this year's monthly totals of the specified MonthlySummary field as a list.
+        The summaries of all labels are added together.
+        """
+
         td = today()
         start_date = date(year=td.year, month=1, day=1)
 
-        operations = Operation.objects.filter(
-            account=self).exclude(
-                final_date=None).filter(
-                    final_date__gte=start_date).filter(
-                        final_date__lte=td).filter(
-                            amount__gt=0)
+        rows = MonthlySummary.objects.filter(
+            account=self).filter(
+                month__gte=start_date).filter(
+                    month__lte=td).values('month').annotate(total=Sum(field))
 
-        income = [0.0] * 12
-        for op in operations:
-            income[op.final_date.month - 1] += float(op.amount)
+        totals = [0.0] * 12
+        for row in rows:
+            totals[row['month'].month - 1] = round(float(row['total']), 2)
 
-        return income
+        return totals
 
-    def get_this_year_expenses(self):
-        """Returns this year's expenses as a list."""
+    def get_this_month_label_totals(self):
+        """Returns this month's income and expenses grouped by label with a single query.
+
+        Returns a list of `(label_id, label_name, income, expenses)` tuples ordered by the label name.
+        The names are prefixed like `str(label)`. The totals are floats.
+        Unlabeled operations have None as the label ID and name.
+        """
 
         td = today()
-        start_date = date(year=td.year, month=1, day=1)
 
-        operations = Operation.objects.filter(
-            account=self).exclude(
-                final_date=None).filter(
-                    final_date__gte=start_date).filter(
-                        final_date__lte=td).filter(
-                            amount__lt=0)
+        def cents(field: str):
+            return Sum(Cast(Round(F(field) * 100), output_field=models.BigIntegerField()))
 
-        expenses = [0.0] * 12
-        for op in operations:
-            expenses[op.final_date.month - 1] -= float(op.amount)
+        rows = MonthlySummary.objects.filter(
+            account=self, month=date(year=td.year, month=td.month, day=1)).values_list(
+                'label_id', 'label__name', 'label__account_id', 'label__home_id').annotate(
+                    income=cents('income'), expenses=cents('expenses')).order_by('label__name', 'label_id')
 
-        return expenses
+        return [(label_id, Label.get_display_name(name, account_id, home_id) if label_id else None,
+                 income / 100, expenses / 100)
+                for label_id, name, account_id, home_id, income, expenses in rows if income or expenses]
 
     def get_this_month_operations(self):
         """Returns this month's operations."""
@@ -372,14 +476,41 @@ class Account(ConvenienceModel):
                     final_date__gte=start_date).filter(
                         final_date__lte=td)
 
-    def finalize_operations(self):
-        """Finalizes all operations for the account."""
+    def finalize_operations(self, ids: list[int] | None = None):
+        """Finalizes all operations for the account or only the ones with the specified `ids`.
+        The operations are finalized with a single UPDATE and the current amount is updated with one delta.
+
+        Returns the number of finalized operations.
+        """
 
         operations = Operation.objects.filter(
             account=self).filter(final_date=None)
+        if ids is not None:
+            operations = operations.filter(id__in=ids)
+
+        final_date = today()
+        cent = decimal.Decimal('0.01')
+
+        with transaction.atomic():
+            # Lock the account so concurrent finalizations do not count the same operations twice.
+            list(Account.objects.select_for_update().filter(id=self.id).values_list('id'))
 
-        for op in operations:
-            op.finalize()
+            totals = operations.values('label_id').annotate(
+                income=Sum('amount', filter=Q(amount__gt=0)),
+                expenses=Sum('amount', filter=Q(amount__lt=0))).order_by()
+
+            label_totals = {}
+            for row in totals:
+                label_totals[row['label_id']] = (decimal.Decimal(row['income'] or 0).quantize(cent),
+                                                 -decimal.Decimal(row['expenses'] or 0).quantize(cent))
+            MonthlySummary.record_totals(self.id, final_date, label_totals)
+            delta = sum((income - expenses for income, expenses in label_totals.values()), decimal.Decimal('0.00'))
+
+            count = operations.update(final_date=final_date)
+            if count:
+                self.apply_amounts(current=delta)
+
+        return count
 
     def add_to_current(self, amount: float, commit: bool = True):
         """Used to add the specified value to the current account. Return the new `current_amount`.
@@ -387,9 +518,10 @@ class Account(ConvenienceModel):
         If `commit` is False the Account is not saved to the database.
         """
 
-        self.current_amount += amount
         if commit:
-            self.save()
+            self.apply_amounts(current=amount)
+        else:
+            self.current_amount += amount
 
         return self.current_amount
 
@@ -399,12 +531,47 @@ class Account(ConvenienceModel):
         If `commit` is False the Account is not saved to the database.
         """
 
-        self.final_amount += amount
         if commit:
-            self.save()
+            self.apply_amounts(final=amount)
+        else:
+            self.final_amount += amount
 
         return self.final_amount
 
+    def apply_amounts(self, final: decimal.Decimal = 0, current: decimal.Decimal = 0):
+        """Atomically adds the specified values to the amounts of money in the database.
+
+        A single UPDATE touching only the amount columns (and bumping the version) is made so concurrent
+        changes are not lost.
+        The amounts are clamped to `MAX_AMOUNT`. The in-memory amounts are updated the same way
+        but they do not include concurrent changes made by others.
+        """
+
+        final, current = decimal.Decimal(str(final)), decimal.Decimal(str(current))
+
+        metrics.BALANCE_UPDATES.inc()
+        Account.objects.filter(id=self.id).update(
+            final_amount=self._clamped(F('final_amount') + final),
+            current_amount=self._clamped(F('current_amount') + current),
+            version=F('version') + 1)
+
+        self.final_amount = self._clamp(decimal.Decimal(str(self.final_amount)) + final)
+        self.current_amount = self._clamp(decimal.Decimal(str(self.current_amount)) + current)
+
+    @classmethod
+    def _clamp(cls, amount: decimal.Decimal):
+        """Returns the amount clamped to `MAX_AMOUNT`."""
+
+        return min(max(amount, -cls.MAX_AMOUNT), cls.MAX_AMOUNT)
+
+    @classmethod
+    def _clamped(cls, expression):
+        """Returns the database expression clamped to `MAX_AMOUNT`."""
+
+        field = models.DecimalField(decimal_places=2, max_digits=8)
+        return Greatest(Least(expression, Value(cls.MAX_AMOUNT, output_field=field)),
+                        Value(-cls.MAX_AMOUNT, output_field=field))
+
     def available_labels(self, include_home: bool = True):
         """Returns a QuerySet of all the available labels of this Account. 
 
@@ -445,46 +612,66 @@ class Account(ConvenienceModel):
         If `commit` is False the Account is not saved to the database.
         """
 
-        operations = Operation.objects.filter(account=self)
-        final = 0.0
-        current = 0.0
-
-        for op in operations:
-            amount = float(op.amount)
-            if op.final_date:
-                current += amount
-            final += amount
+        totals = self._sum_operations()
+        metrics.BALANCE_RECALCULATIONS.inc()
 
-        self.final_amount = final
-        self.current_amount = current
+        self.final_amount = totals['final']
+        self.current_amount = totals['current']
 
         if commit:
-            self.save()
+            self.save(update_fields=['final_amount', 'current_amount'])
     
-    def _update_plans(self):
+    def materialize_plans(self):
         """Checks if there are due operation plans for the account and creates operations.
+        It is meant to be run in the background (see the `planoperations` command), not while handling requests.
 
         Returns a tuple of lists: `([plans], [operations])` consisting of the updated plans and created operations.
         The lists can be empty."""
 
+        if not self.has_due_plans():
+            return [], []
+
         qset = OperationPlan.objects.filter(
             account=self).filter(next_date__lte=today())
-        if not qset:
-            return [], []
 
         plans = []
         ops = []
 
         for plan in qset:
-
-            while plan.is_due():
-                op = plan.create_operation()
-                ops.append(op)
-
+            plan.account = self
+            ops.extend(plan.materialize())
             plans.append(plan)
 
         return plans, ops
 
+    def has_due_plans(self):
+        """Checks if any of the Account's operation plans can be due without querying the plans."""
+
+        return self.next_plan_date is not None and self.next_plan_date <= today()
+
+    def update_next_plan_date(self):
+        """Updates the `next_plan_date` from the Account's operation plans and bumps the version."""
+
+        Account.sync_next_plan_dates(id=self.id)
+        self.refresh_from_db(fields=['next_plan_date', 'version'])
+
+    @staticmethod
+    def sync_next_plan_dates(**filters):
+        """Sets the `next_plan_date` of the Accounts matching the filters from their operation plans
+        with a single UPDATE, e.g. for plans created without `save()`. Returns the number of updated Accounts.
+        """
+
+        next_dates = OperationPlan.objects.filter(
+            account=OuterRef('pk')).order_by('next_date').values('next_date')[:1]
+        return Account.objects.filter(**filters).update(
+            next_plan_date=Subquery(next_dates), version=F('version') + 1)
+
+    @staticmethod
+    def bump_versions(**filters):
+        """Increases the version of the Accounts matching the filters with a single UPDATE."""
+
+        Account.objects.filter(**filters).update(version=F('version') + 1)
+
     def add_label(self, label: 'Label', commit: bool = True):
         """Add a new personal label to the database. Returns the newly added Label or None if unsuccessful.
 
@@ -505,59 +692,52 @@ class Account(ConvenienceModel):
     def delete(self, using=None, keep_parents: bool = False):
 
         user = self.user
+        roles.invalidate(self.home_id)
         ret_val = super().delete(using=using, keep_parents=keep_parents)
         user.delete()
         return ret_val
 
+    def get_roles(self):
+        """Returns the cached roles and permissions of this Account's Home (see `roles.get_roles()`)."""
+
+        return roles.get_roles(self.home_id)
+
     def is_admin(self, home: Home = None):
         """Checks if the Account's User is the Home's Admin.
         If no Home is passed the method checks if the user belongs to the Admin permission group.
         """
 
         if home:
-            return home.admin == self
+            return home.admin_id == self.id
 
-        return self.user.groups.filter(name=ADMIN_GROUP).exists()
+        return self.get_roles().in_group(self.id, ADMIN_GROUP)
 
     def is_mod(self, home: Home = None):
         """Checks if the Account's User is the Home's Moderator.
-        If no Home is passed the method checks if the user belongs to the Moderator permission group.
+        If a Home is passed the Account must also belong to it.
         """
 
-        mod = self.user.groups.filter(name=MOD_GROUP).exists()
-
-        if not mod:
+        if home and home.id != self.home_id:
             return False
 
-        if Home:
-            return Account.objects.filter(home=self.home).filter(id=self.id).exists()
-        else:
-            return True
+        return self.get_roles().in_group(self.id, MOD_GROUP)
 
     def make_transaction(self, destination: 'Account', amount: float, description: str = None):
         """Creates a transaction composed of two new operations with the specified description.
 
         The amount is subtracted from the account and added to the destination account.
+        Both accounts are locked and updated in a single database transaction (see `transfers.transfer()`).
         Returns a tuple of `(outcoming, incoming)` transactions"""
 
-        label = Label.get_global(name=('Internal'))
+        from .transfers import transfer
 
-        outcoming = Operation(account=self, amount=-amount,
-                              description=description, final_date=today(), label=label)
-        incoming = Operation(account=destination, amount=amount,
-                             description=description, final_date=today(), label=label)
-
-        outcoming.save()
-        incoming.source = outcoming
-        incoming.save()
-
-        return outcoming, incoming
+        return transfer(self, destination, amount, description)
 
     def has_perm(self, perm: str):
         """Checks if the Account's user has a specified permission.
-        Shortcut for `.user.has_perm()`."""
+        Resolved from the cached Home roles instead of querying the user."""
 
-        return self.user.has_perm(perm)
+        return self.get_roles().has_perm(self.id, perm)
 
     def clear_additional_perms(self):
         """Clear additional user permissions."""
@@ -572,11 +752,20 @@ class Account(ConvenienceModel):
         for perm in perms:
             app_perm = f'budget.{perm[0]}'
             if self.has_perm(app_perm):
-                perm = Permission.objects.get(codename=perm[0])
-                self.user.user_permissions.remove(perm)
+                self.user.user_permissions.remove(Account.get_permission_id(perm[0]))
 
+        roles.invalidate(self.home_id)
         self.save()
 
+    @staticmethod
+    def get_permission_id(codename: str):
+        """Returns the ID of the budget permission from the registry.
+        Raises `Permission.DoesNotExist` if there is no such permission.
+        """
+
+        return registry.get(('permission', codename), lambda: Permission.objects.get(
+            codename=codename, content_type__app_label='budget').id)
+
     def add_perm(self, codename: str, commit: bool = True):
         """Add user permission specified by the codename.
         Return True if the permission was added or the user already had it."""
@@ -585,8 +774,8 @@ class Account(ConvenienceModel):
             return True
 
         try:
-            perm = Permission.objects.get(codename=codename)
-            self.user.user_permissions.add(perm)
+            self.user.user_permissions.add(Account.get_permission_id(codename))
+            roles.invalidate(self.home_id)
             if commit:
                 self.user.save()
 
@@ -602,8 +791,8 @@ class Account(ConvenienceModel):
             return True
 
         try:
-            perm = Permission.objects.get(codename=codename)
-            self.user.user_permissions.remove(perm)
+            self.user.user_permissions.remove(Account.get_permission_id(codename))
+            roles.invalidate(self.home_id)
             if commit:
                 self.user.save()
 
@@ -612,16 +801,39 @@ class Account(ConvenienceModel):
             return False
 
     def get_operations(self):
-        """Updates the operation plans and returns this Account's operations as a QuerySet."""
+        """Returns this Account's operations as a QuerySet. Due plans are not materialized."""
 
-        self._update_plans()
         return Operation.objects.filter(account=self)
 
+    def get_operation_list(self):
+        """Returns this Account's operations prepared for rendering lists (see `OperationQuerySet.for_list()`)."""
+
+        return self.get_operations().for_list()
+
+    def get_operations_page(self, cursor: str | None = None, size: int = 25):
+        """Returns a page of this Account's operations starting after the `cursor` using keyset pagination.
+        The operations are ordered from the newest ones. If no cursor is passed the first page is returned.
+
+        Returns a tuple of `(operations, next_cursor)`. The `next_cursor` is None on the last page.
+        """
+
+        qset = self.get_operation_list()
+
+        position = Operation.parse_cursor(cursor) if cursor else None
+        if position:
+            creation_date, op_id = position
+            qset = qset.filter(creation_date__lte=creation_date).filter(
+                Q(creation_date__lt=creation_date) | Q(id__lt=op_id))
+
+        operations = list(qset[:size + 1])
+        next_cursor = operations[size - 1].get_cursor() if len(operations) > size else None
+
+        return operations[:size], next_cursor
+
     def get_plans(self):
-        """Updates the operation plans and returns this Account's operation plans as a QuerySet."""
+        """Returns this Account's operation plans as a QuerySet. Due plans are not materialized."""
 
-        self._update_plans()
-        return OperationPlan.objects.filter(account=self)
+        return OperationPlan.objects.filter(account=self).select_related('label', 'account__home')
 
     def rename(self, new_name: str):
         """Changes the Account's User name (not username)."""
@@ -630,9 +842,16 @@ class Account(ConvenienceModel):
 
         self.user.first_name = new_name
         self.user.save()
+        # The name is shown in the other members' operations
+        cache.invalidate_home(self.home_id)
 
     def get_title(self):
-        """Returns the account title ([Administrator], [Moderator] or an empty string)."""
+        """Returns the account title ([Administrator], [Moderator] or an empty string).
+        Uses the `for_roster()` role annotation if present.
+        """
+
+        if hasattr(self, 'role'):
+            return {'admin': '[Administrator]', 'mod': '[Moderator]'}.get(self.role, '')
 
         if self.is_admin():
             return '[Administrator]'
@@ -685,6 +904,9 @@ class Label(ConvenienceModel):
             ('manage_home_labels', 'Can create or delete home labels.')
         }
         ordering = ('name', 'id')
+        indexes = [
+            models.Index(fields=['home', 'account', 'name'], name='label_home_account_name_idx'),
+        ]
 
     name = models.CharField(max_length=32, verbose_name='Label name')
     """Label name."""
@@ -705,9 +927,6 @@ class Label(ConvenienceModel):
         default=False, blank=True, verbose_name='If the label is a default label.')
     """If the label is a default label."""
 
-    _global_initialized = False
-    """TODO"""
-
     DEFAULT_LABELS = {
         'Food',
         'Transport',
@@ -726,11 +945,17 @@ class Label(ConvenienceModel):
     }
 
     def __str__(self):
+        return Label.get_display_name(self.name, self.account_id, self.home_id)
+
+    @staticmethod
+    def get_display_name(name: str, account_id: int | None, home_id: int | None) -> str:
+        """Returns the label name prefixed with `[Home]` or `[Special]` if the label is not personal."""
+
         prefix = ''
-        if self.account is None:
-            prefix = '[Home] ' if self.home else '[Special] '
+        if account_id is None:
+            prefix = '[Home] ' if home_id else '[Special] '
 
-        return prefix + self.name
+        return prefix + name
 
     def rename(self, new_name: str, commit: bool = True):
         """Renames the label. Returns True if renaming was successful.
@@ -765,18 +990,47 @@ class Label(ConvenienceModel):
     def get_global(name: str | None = None):
         """Returns a global label with the specified name or all if no name is specified."""
 
-        if not Label._global_initialized:
-            Label._init_global()
+        Label._init_global()
 
         qset = Label.objects.filter(home=None)
 
-        return qset.get(name=name) if name else qset
+        return qset.get(id=Label.get_global_id(name)) if name else qset
+
+    @staticmethod
+    def get_global_id(name: str):
+        """Returns the ID of the global label from the registry, creating the label on first use."""
+
+        return registry.get(('label', name), lambda: Label.objects.get_or_create(
+            name=name, home=None, is_default=True)[0].id)
+
+    def save(self, force_insert: bool = False, force_update: bool = False, using=None, update_fields=None):
+        """Overriden save method bumping the versions of the Accounts using the label."""
+
+        super().save(force_insert=force_insert, force_update=force_update,
+                     using=using, update_fields=update_fields)
+        self._bump_versions()
+
+    def delete(self, using=None, keep_parents: bool = False):
+        """Overriden delete method moving the label's monthly summaries to the unlabeled ones."""
+
+        MonthlySummary.clear_label(self)
+        self._bump_versions()
+
+        return super().delete(using=using, keep_parents=keep_parents)
+
+    def _bump_versions(self):
+        """Bumps the versions of the Accounts which can use the label. Global labels are skipped."""
+
+        if self.account_id:
+            Account.bump_versions(id=self.account_id)
+        elif self.home_id:
+            Account.bump_versions(home_id=self.home_id)
 
     def _init_global():
         """Initializes global labels."""
 
         for name in Label.GLOBAL_LABELS:
-            Label.objects.get_or_create(name=name, home=None, is_default=True)
+            Label.get_global_id(name)
 
 
 class BaseOperation(ConvenienceModel):
@@ -804,7 +1058,32 @@ class BaseOperation(ConvenienceModel):
     """Optional description of the operation."""
 
     def currency_amount(self):
-        return f'{self.amount} {self.account.home.currency}'
+        currency = getattr(self, 'currency', None) or self.account.home.currency
+        return f'{self.amount} {currency}'
+
+
+class OperationQuerySet(models.QuerySet):
+    """Custom Operation QuerySet."""
+
+    def for_list(self):
+        """Returns the operations prepared for rendering operation lists with a fixed number of queries.
+
+        The labels are fetched in the same query and the operations are annotated with:
+        - `currency` - the Home currency,
+        - `direction` - 'in' for received transactions, 'out' for sent ones and an empty string otherwise,
+        - `counterparty_username` and `counterparty_first_name` - the other transaction side's user names.
+        """
+
+        return self.select_related('label').annotate(
+            currency=F('account__home__currency'),
+            direction=Case(
+                When(source__isnull=False, then=Value('in')),
+                When(destination__isnull=False, then=Value('out')),
+                default=Value(''), output_field=models.CharField()),
+            counterparty_username=Coalesce(
+                F('source__account__user__username'), F('destination__account__user__username')),
+            counterparty_first_name=Coalesce(
+                F('source__account__user__first_name'), F('destination__account__user__first_name')))
 
 
 class Operation(BaseOperation):
@@ -815,6 +1094,15 @@ class Operation(BaseOperation):
             ('make_transactions', 'Can make an internal transaction to another user.')
         }
         ordering = ('-creation_date', '-id')
+        indexes = [
+            models.Index(fields=['account', '-creation_date', '-id'], name='operation_account_created_idx'),
+            models.Index(fields=['account', 'final_date'], name='operation_account_final_idx'),
+            models.Index(fields=['account', '-creation_date', '-id'], condition=Q(final_date=None),
+                         name='operation_unfinalized_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'import_hash'], name='unique_operation_import'),
+        ]
 
     creation_date = models.DateField(
         auto_now_add=True, verbose_name='Time created')
@@ -833,19 +1121,33 @@ class Operation(BaseOperation):
     source = models.OneToOneField('self', on_delete=models.SET_NULL, null=True,
                                   verbose_name='Optional transaction source operation.', related_name='destination')
 
+    import_hash = models.CharField(max_length=40, null=True, blank=True, editable=False,
+                                   verbose_name='Imported operation hash')
+    """Hash of the account, date, amount and description of an imported operation. Used for deduplication."""
+
+    objects = OperationQuerySet.as_manager()
+
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
-        """Overriden save method to update account money during saving."""
+        """Overriden save method to update account money during saving.
+        The operation and the account amounts are saved in one transaction.
+        """
 
-        if not self.is_saved():
-            account = self.account
-            if self.final_date is not None:
-                account.add_to_current(self.amount, commit=False)
+        created = not self.is_saved()
 
-            account.add_to_final(self.amount)
+        with transaction.atomic():
+            if created:
+                current = self.amount if self.final_date is not None else 0
+                self.account.apply_amounts(final=self.amount, current=current)
 
-        super().save(force_insert=force_insert, force_update=force_update,
-                     using=using, update_fields=update_fields)
+            else:
+                Account.bump_versions(id=self.account_id)
+
+            super().save(force_insert=force_insert, force_update=force_update,
+                         using=using, update_fields=update_fields)
+
+            if created:
+                MonthlySummary.record_operation(self)
 
     def delete(self, using=None, keep_parents=False):
         """Overriden delete method to update account money during deleting."""
@@ -862,11 +1164,9 @@ class Operation(BaseOperation):
                 dest.save()
                 dest.delete()
 
-        account = self.account
-        if self.final_date is not None:
-            account.add_to_current(-self.amount, commit=False)
-
-        account.add_to_final(-self.amount)
+        current = -self.amount if self.final_date is not None else 0
+        self.account.apply_amounts(final=-self.amount, current=current)
+        MonthlySummary.record_operation(self, sign=-1)
 
         return super().delete(using=using, keep_parents=keep_parents)
 
@@ -888,6 +1188,24 @@ class Operation(BaseOperation):
 
         self.account.add_to_current(self.amount)
         self.save()
+        MonthlySummary.record_operation(self)
+
+    def get_cursor(self):
+        """Returns the keyset pagination cursor pointing at this operation."""
+
+        return f'{self.creation_date.isoformat()}_{self.id}'
+
+    @staticmethod
+    def parse_cursor(cursor: str):
+        """Parses a cursor created by `get_cursor()`.
+        Returns a tuple of `(creation_date, id)` or None if the cursor is invalid.
+        """
+
+        try:
+            creation_date, op_id = cursor.split('_')
+            return date.fromisoformat(creation_date), int(op_id)
+        except (AttributeError, ValueError):
+            return None
 
     def is_transaction(self) -> bool:
         """Checks if the Operation is an internal transaction."""
@@ -897,6 +1215,23 @@ class Operation(BaseOperation):
         except self.DoesNotExist:
             return False
 
+    def get_counterparty_name(self):
+        """Returns the other transaction side's display name like `Account.get_username()`.
+        Uses the `for_list()` annotations if present. Returns an empty string if the Operation is not a transaction.
+        """
+
+        if not hasattr(self, 'counterparty_username'):
+            other = self.source if self.source else self.get_destination()
+            return other.account.get_username() if other else ''
+
+        if not self.counterparty_username:
+            return ''
+
+        if self.counterparty_first_name:
+            return f'{self.counterparty_first_name} ({self.counterparty_username})'
+
+        return self.counterparty_username
+
     def get_destination(self):
         """Returns the operation destination if the operation is a transaction.
         If not it does not throw an Error but returns None."""
@@ -912,6 +1247,9 @@ class OperationPlan(BaseOperation):
             ('plan_for_others', 'Can make plans for another user.')
         }
         ordering = ('next_date', 'id')
+        indexes = [
+            models.Index(fields=['account', 'next_date'], name='plan_account_next_date_idx'),
+        ]
 
     class TimePeriod(models.TextChoices):
         """Enum class for the time period."""
@@ -942,33 +1280,94 @@ class OperationPlan(BaseOperation):
         super().save(force_insert=force_insert, force_update=force_update,
                      using=using, update_fields=update_fields)
 
-    def calculate_next(self, base_date: date = None):
-        """Calculates the next date of the operation creation.
+        self.account.update_next_plan_date()
 
-        If no `base_date` is specified the next planned date is used.
-        """
+    def delete(self, using=None, keep_parents: bool = False):
+        """Overriden delete method to update the Account's next plan date."""
+
+        ret_val = super().delete(using=using, keep_parents=keep_parents)
+        self.account.update_next_plan_date()
+
+        return ret_val
+
+    def get_period_delta(self):
+        """Returns the time between two consecutive operations as a timedelta."""
 
         if self.period == self.TimePeriod.DAY:
-            delta = timedelta(days=self.period_count)
+            return timedelta(days=self.period_count)
 
         elif self.period == self.TimePeriod.WEEK:
-            delta = timedelta(weeks=self.period_count)
+            return timedelta(weeks=self.period_count)
 
         elif self.period == self.TimePeriod.MONTH:
-            delta = timedelta(days=30 * self.period_count)
+            return timedelta(days=30 * self.period_count)
 
         elif self.period == self.TimePeriod.YEAR:
-            delta = timedelta(days=365 * self.period_count)
+            return timedelta(days=365 * self.period_count)
 
-        else:
-            delta = timedelta()
+        return timedelta()
+
+    def calculate_next(self, base_date: date = None):
+        """Calculates the next date of the operation creation.
+
+        If no `base_date` is specified the next planned date is used.
+        """
 
         if base_date is None:
             base_date = self.next_date
 
-        next_date = base_date + delta
+        next_date = base_date + self.get_period_delta()
         return next_date
 
+    def get_due_dates(self, until: date = None):
+        """Returns a list of all the due operation dates up to `until` (inclusive) starting from the next date.
+        If `until` is not specified today's date is used.
+        """
+
+        until = until or today()
+        delta = self.get_period_delta()
+
+        if self.next_date > until or not delta:
+            return []
+
+        count = (until - self.next_date) // delta + 1
+        return [self.next_date + i * delta for i in range(count)]
+
+    def materialize(self, until: date = None):
+        """Creates all the due operations up to `until` (today by default) at once. Returns the list of created Operations.
+
+        The operations are inserted with a single query, the `next_date` is advanced once
+        and the Account's final amount is updated with a single delta, all in one transaction.
+        If the plan was already advanced by someone else no operations are created.
+        """
+
+        dates = self.get_due_dates(until)
+        if not dates:
+            return []
+
+        prev_date = self.next_date
+        next_date = self.calculate_next(dates[-1])
+
+        with transaction.atomic():
+            advanced = OperationPlan.objects.filter(
+                id=self.id, next_date=prev_date).update(next_date=next_date)
+            if not advanced:
+                self.refresh_from_db(fields=['next_date'])
+                return []
+
+            ops = Operation.objects.bulk_create([
+                Operation(account=self.account,
+                          label=self.label,
+                          amount=self.amount,
+                          description=self.description,
+                          plan=self) for _ in dates])
+
+            self.account.add_to_final(self.amount * len(ops))
+            self.next_date = next_date
+            self.account.update_next_plan_date()
+
+        return ops
+
     def create_operation(self, commit: bool = True, recalculate: bool = True):
         """Creates a new Operation object in the database according to this plan. Returns the created Operation.
         If `recalculate` is True a new `next_date` is calculated from today."""
@@ -1003,3 +1402,235 @@ class OperationPlan(BaseOperation):
         time_label = self.TimePeriod(self.period).label.lower()
 
         return f'Every {self.period_count} {time_label}s' if plural else f'Every {time_label}'
+
+
+class MonthlySummary(ConvenienceModel):
+    """Incrementally maintained monthly income and expenses of an Account per label.
+    Only finalized operations are summarized and they are assigned to the month of their `final_date`.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account', 'month', 'label'], name='unique_monthly_summary')
+        ]
+        ordering = ('month', 'id')
+
+    account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, verbose_name='Account')
+    """The account that the summary belongs to."""
+
+    label = models.ForeignKey(
+        Label, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Label')
+    """The label of the summarized operations. None for the operations without a label."""
+
+    month = models.DateField(verbose_name='Month')
+    """The first day of the summarized month."""
+
+    income = models.DecimalField(
+        decimal_places=2, max_digits=10, default=0, verbose_name='Income')
+    """Sum of the positive operation amounts."""
+
+    expenses = models.DecimalField(
+        decimal_places=2, max_digits=10, default=0, verbose_name='Expenses')
+    """Sum of the negative operation amounts as a positive number."""
+
+    def __str__(self):
+        return f'{self.account} {self.month:%Y-%m} {self.label or "-"}'
+
+    @staticmethod
+    def record(account_id: int, label_id: int | None, day: date,
+               income: decimal.Decimal = 0, expenses: decimal.Decimal = 0):
+        """Adds the specified income and expenses to the summary of the month containing `day`.
+        The summary is created if it does not exist yet.
+        """
+
+        month = day.replace(day=1)
+        qset = MonthlySummary.objects.filter(
+            account_id=account_id, label_id=label_id, month=month)
+
+        updated = qset.update(income=F('income') + income,
+                              expenses=F('expenses') + expenses)
+        if not updated:
+            MonthlySummary.objects.create(account_id=account_id, label_id=label_id,
+                                          month=month, income=income, expenses=expenses)
+
+    @staticmethod
+    def record_totals(account_id: int, day: date, totals: dict[int | None, tuple[decimal.Decimal, decimal.Decimal]]):
+        """Adds the `(income, expenses)` totals by label ID to the summaries of the month containing `day`.
+        Makes a constant number of queries regardless of the number of labels.
+        """
+
+        if not totals:
+            return
+
+        month = day.replace(day=1)
+        labels = Q(label_id__in=[label_id for label_id in totals if label_id is not None])
+        if None in totals:
+            labels |= Q(label__isnull=True)
+        qset = MonthlySummary.objects.filter(labels, account_id=account_id, month=month)
+
+        existing = set(qset.values_list('label_id', flat=True))
+        if existing:
+            conditions = {label_id: Q(label__isnull=True) if label_id is None else Q(label_id=label_id)
+                          for label_id in existing}
+
+            def delta(index: int):
+                return Case(*[When(condition, then=Value(totals[label_id][index]))
+                              for label_id, condition in conditions.items()],
+                            default=Value(0), output_field=models.DecimalField())
+
+            qset.update(income=F('income') + delta(0), expenses=F('expenses') + delta(1))
+
+        MonthlySummary.objects.bulk_create([
+            MonthlySummary(account_id=account_id, label_id=label_id, month=month, income=income, expenses=expenses)
+            for label_id, (income, expenses) in totals.items() if label_id not in existing])
+
+    @staticmethod
+    def record_operation(operation: 'Operation', sign: int = 1):
+        """Adds a finalized operation to its monthly summary.
+        If `sign` is -1 the operation is subtracted instead. Unfinalized operations are ignored.
+        """
+
+        if operation.final_date is None:
+            return
+
+        amount = abs(operation.amount) * sign
+        if operation.amount > 0:
+            MonthlySummary.record(operation.account_id, operation.label_id,
+                                  operation.final_date, income=amount)
+        else:
+            MonthlySummary.record(operation.account_id, operation.label_id,
+                                  operation.final_date, expenses=amount)
+
+    @staticmethod
+    def clear_label(label: Label):
+        """Moves the summaries of the label to the unlabeled summaries. Used before the label is deleted."""
+
+        qset = MonthlySummary.objects.filter(label=label)
+        for summary in qset:
+            MonthlySummary.record(summary.account_id, None, summary.month,
+                                  income=summary.income, expenses=summary.expenses)
+
+        qset.delete()
+
+    @staticmethod
+    def aggregate_operations(account_ids: list[int] | None = None):
+        """Calculates the summaries from the raw operations of all Accounts or only the ones with `account_ids`.
+
+        Returns a dictionary mapping `(account_id, label_id, month)` to a tuple of `(income, expenses)`.
+        """
+
+        operations = Operation.objects.all()
+        if account_ids is not None:
+            operations = operations.filter(account_id__in=account_ids)
+
+        rows = operations.exclude(
+            final_date=None).annotate(
+                month=TruncMonth('final_date')).values(
+                    'account_id', 'label_id', 'month').annotate(
+                        income=Sum('amount', filter=Q(amount__gt=0)),
+                        expenses=Sum('amount', filter=Q(amount__lt=0))).order_by()
+
+        cent = decimal.Decimal('0.01')
+        summaries = {}
+        for row in rows.iterator():
+            income = decimal.Decimal(row['income'] or 0).quantize(cent)
+            expenses = -decimal.Decimal(row['expenses'] or 0).quantize(cent)
+            summaries[(row['account_id'], row['label_id'], row['month'])] = (income, expenses)
+
+        return summaries
+
+    @staticmethod
+    def rebuild(account_ids: list[int] | None = None):
+        """Removes the summaries of all Accounts or only the ones with `account_ids`
+        and creates them again from the raw operations.
+        """
+
+        summaries = MonthlySummary.objects.all()
+        if account_ids is not None:
+            summaries = summaries.filter(account_id__in=account_ids)
+
+        with transaction.atomic():
+            summaries.delete()
+            MonthlySummary.objects.bulk_create(
+                [MonthlySummary(account_id=account_id, label_id=label_id, month=month,
+                                income=income, expenses=expenses)
+                 for (account_id, label_id, month), (income, expenses)
+                 in MonthlySummary.aggregate_operations(account_ids).items()],
+                batch_size=500)
+
+    @staticmethod
+    def verify():
+        """Compares the stored summaries with the raw operations.
+
+        Returns a list of `(account_id, label_id, month)` keys of the summaries that differ.
+        """
+
+        expected = MonthlySummary.aggregate_operations()
+        zero = decimal.Decimal('0.00')
+        cent = decimal.Decimal('0.01')
+
+        stored = {}
+        for summary in MonthlySummary.objects.all().iterator():
+            key = (summary.account_id, summary.label_id, summary.month)
+            income, expenses = stored.get(key, (zero, zero))
+            stored[key] = (income + summary.income, expenses + summary.expenses)
+
+        mismatches = []
+        for key in expected.keys() | stored.keys():
+            income, expenses = stored.get(key, (zero, zero))
+            if (income.quantize(cent), expenses.quantize(cent)) != expected.get(key, (zero, zero)):
+                mismatches.append(key)
+
+        return mismatches
+
+
+
+class PlanRun(models.Model):
+    """Statistics of a single `planoperations` run. Kept in the database, so they can be reported
+    by the web processes (see `metrics`).
+    """
+
+    class Meta:
+        ordering = ('-time', '-id')
+
+    time = models.DateTimeField(auto_now_add=True, verbose_name='Time')
+    """Time of the end of the run."""
+
+    duration = models.FloatField(verbose_name='Duration')
+    """Duration of the run in seconds."""
+
+    operations = models.PositiveIntegerField(verbose_name='Operations')
+    """Number of operations created from plans."""
+
+    plans = models.PositiveIntegerField(verbose_name='Plans')
+    """Number of plans processed."""
+
+    errors = models.PositiveIntegerField(verbose_name='Errors')
+    """Number of Accounts whose plans failed to materialize."""
+
+    def __str__(self):
+        return f'{self.time:%Y-%m-%d %H:%M:%S} {self.operations} operation(s)'
+
+    @staticmethod
+    def totals() -> dict:
+        """Returns the number of runs and the sums of their statistics."""
+
+        return PlanRun.objects.aggregate(
+            runs=models.Count('id'),
+            operations=Coalesce(Sum('operations'), 0),
+            plans=Coalesce(Sum('plans'), 0),
+            errors=Coalesce(Sum('errors'), 0),
+            duration=Coalesce(Sum('duration'), 0.0))
+
+def warm_registry():
+    """Clears the registry and loads the global labels, permission groups and permissions into it."""
+
+    registry.clear()
+
+    Label._init_global()
+    for name in (ADMIN_GROUP, MOD_GROUP):
+        Home.get_group_id(name)
+    for perm in BASE_ADMIN_PERMS | USER_PERMS:
+        Account.get_permission_id(perm[0])
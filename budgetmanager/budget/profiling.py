@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.text import slugify
+
+INTERVAL = 0.005
+"""Default number of seconds between two samples."""
+
+MAX_SAMPLES = 20000
+"""Default maximum number of samples of a single profile. Sampling stops when it is reached."""
+
+MAX_DEPTH = 200
+"""Maximum number of frames of a sampled stack. The outermost frames are dropped."""
+
+_active = threading.Lock()
+
+
+def get_profile_dir() -> str:
+    """Returns the directory the profiles are written to (the `BUDGET_PROFILE_DIR` setting)."""
+
+    return getattr(settings, 'BUDGET_PROFILE_DIR', None) or os.path.join(tempfile.gettempdir(), 'budget-profiles')
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{getattr(code, "co_qualname", code.co_name)}'.replace(';', ':')
+
+
+class Sampler:
+    """Sampling profiler of a single thread. A background thread records the thread's stack
+    every `interval` seconds until stopped or until `max_samples` samples are taken.
+
+    Only one sampler runs at a time in a process, so the overhead stays bounded.
+    The samples are written in the collapsed stack format (`outer;inner count` lines)
+    read by flame graph tools and speedscope.
+    """
+
+    def __init__(self, interval: float | None = None, max_samples: int | None = None):
+        self.interval = interval or getattr(settings, 'BUDGET_PROFILE_INTERVAL', INTERVAL)
+        self.max_samples = max_samples or getattr(settings, 'BUDGET_PROFILE_MAX_SAMPLES', MAX_SAMPLES)
+        self.stacks = Counter()
+        self.samples = 0
+
+        self._thread_id = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> bool:
+        """Starts sampling the calling thread. Returns False if another sampler is running."""
+
+        if not _active.acquire(blocking=False):
+            return False
+
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='budget-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        _active.release()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread is not None:
+            self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and self.samples < self.max_samples:
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                break
+
+            names = []
+            while frame is not None and len(names) < MAX_DEPTH:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Returns the samples in the collapsed stack format, the most frequent stacks first."""
+
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def write(self, name: str) -> str:
+        """Writes the samples to a new file in the profile directory. Returns the file path."""
+
+        directory = get_profile_dir()
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, f'{slugify(name) or "profile"}-{datetime.now():%Y%m%d-%H%M%S-%f}.collapsed')
+        with open(path, 'w') as file:
+            file.write(self.collapsed())
+
+        return path
+
+
+def is_requested(request) -> bool:
+    """Checks if a staff user asked to profile the request with the `profile` query parameter
+    or the `X-Budget-Profile` header.
+    """
+
+    if 'profile' not in request.GET and 'HTTP_X_BUDGET_PROFILE' not in request.META:
+        return False
+
+    return request.user.is_authenticated and request.user.is_staff
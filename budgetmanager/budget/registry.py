@@ -0,0 +1,38 @@
+from threading import RLock
+from typing import Callable, Hashable
+
+
+class Registry:
+    """Thread-safe, process-wide cache of IDs of rows which are created once and never change
+    (global labels, permission groups, permissions).
+    """
+
+    def __init__(self):
+        self._ids: dict[Hashable, int] = {}
+        self._lock = RLock()
+
+    def get(self, key: Hashable, loader: Callable[[], int]) -> int:
+        """Returns the ID stored under the key. If missing, it is loaded with `loader` exactly once.
+        Loaders may look up other keys.
+        """
+
+        try:
+            return self._ids[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._ids:
+                self._ids[key] = loader()
+
+            return self._ids[key]
+
+    def clear(self):
+        """Removes all the stored IDs, e.g. after the database is flushed."""
+
+        with self._lock:
+            self._ids.clear()
+
+
+registry = Registry()
+"""The registry shared by the whole process."""
@@ -0,0 +1,139 @@
+from contextvars import ContextVar
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+CACHE_TIMEOUT = 300
+"""Number of seconds the resolved roles of a Home are kept in the cache."""
+
+_scope: ContextVar[dict | None] = ContextVar('budget_roles', default=None)
+
+
+class HomeRoles:
+    """Group and permission memberships of all accounts in a Home."""
+
+    def __init__(self, admin_id: int | None):
+        self.admin_id = admin_id
+        self.groups: dict[int, set[str]] = {}
+        self.perms: dict[int, set[str]] = {}
+        self.superusers: set[int] = set()
+
+    def in_group(self, account_id: int, name: str) -> bool:
+        """Checks if the account's user belongs to the group."""
+
+        return name in self.groups.get(account_id, ())
+
+    def has_perm(self, account_id: int, perm: str) -> bool:
+        """Checks if the account's user has the permission (`app_label.codename`) directly or through a group."""
+
+        return account_id in self.superusers or perm in self.perms.get(account_id, ())
+
+    @classmethod
+    def load(cls, home_id: int):
+        """Loads the memberships of the Home's accounts from the database in two queries."""
+
+        accounts = User.objects.filter(account__home_id=home_id)
+
+        roles = None
+        group_rows = accounts.values_list(
+            'account__id', 'account__home__admin_id', 'is_active', 'is_superuser',
+            'groups__name', 'groups__permissions__content_type__app_label', 'groups__permissions__codename')
+        for account_id, admin_id, is_active, is_superuser, group, app_label, codename in group_rows:
+            if roles is None:
+                roles = cls(admin_id)
+
+            roles.groups.setdefault(account_id, set())
+            roles.perms.setdefault(account_id, set())
+            if not is_active:
+                continue
+
+            if is_superuser:
+                roles.superusers.add(account_id)
+            if group:
+                roles.groups[account_id].add(group)
+            if codename:
+                roles.perms[account_id].add(f'{app_label}.{codename}')
+
+        roles = roles or cls(None)
+
+        perm_rows = accounts.filter(is_active=True, user_permissions__isnull=False).values_list(
+            'account__id', 'user_permissions__content_type__app_label', 'user_permissions__codename')
+        for account_id, app_label, codename in perm_rows:
+            roles.perms[account_id].add(f'{app_label}.{codename}')
+
+        return roles
+
+
+def _load_version(home_id: int):
+    from .models import Home
+
+    return Home.objects.filter(id=home_id).values_list('roles_version', flat=True).first()
+
+
+def activate():
+    """Starts a new scope (e.g. a request) in which the roles are resolved at most once per Home.
+    Returns a token for `deactivate()`.
+    """
+
+    return _scope.set({})
+
+
+def deactivate(token):
+    _scope.reset(token)
+
+
+def remember(home_id: int, version):
+    """Stores the roles version of a Home loaded by the caller in the current scope,
+    so it is not queried again (see `get_roles()`).
+    """
+
+    scope = _scope.get()
+    if scope is not None:
+        scope.setdefault(home_id, (version, None))
+
+
+def get_roles(home_id: int) -> HomeRoles:
+    """Returns the roles of the Home from the cache, loading them if needed.
+
+    The cache key contains the Home's `roles_version`, which is read from the database,
+    so the roles changed by other processes are never served from a process-local cache.
+    Within a scope (see `activate()`) the roles of a Home are resolved only once.
+    """
+
+    scope = _scope.get()
+    version, roles = scope.get(home_id, (None, None)) if scope is not None else (None, None)
+    if roles is not None:
+        return roles
+
+    if version is None:
+        version = _load_version(home_id)
+        if version is None:
+            return HomeRoles.load(home_id)
+
+    key = f'budget:roles:{home_id}:{version.hex}'
+    roles = cache.get(key)
+    if roles is None:
+        roles = HomeRoles.load(home_id)
+        cache.set(key, roles, CACHE_TIMEOUT)
+
+    if scope is not None:
+        scope[home_id] = (version, roles)
+
+    return roles
+
+
+def invalidate(home_id: int | None):
+    """Invalidates the cached roles of the Home by changing its roles version in the database."""
+
+    if home_id is None:
+        return
+
+    from .models import Home
+
+    version = uuid4()
+    Home.objects.filter(id=home_id).update(roles_version=version)
+
+    scope = _scope.get()
+    if scope is not None:
+        scope[home_id] = (version, None)
@@ -2,39 +2,25 @@ function createPieChart() {
     const pieIncome = document.getElementById('pieIncome').getContext('2d');
     const pieExpenses = document.getElementById('pieExpenses').getContext('2d');
 
-    let incomeData = {};
-    let expensesData = {};
+    const labels = chartData.labels;
 
-    const opData = JSON.parse(document.getElementById('operationData').innerHTML);
-    opData.forEach(element => {
-        const op = JSON.parse(element);
-
-        const opAmount = parseFloat(op.amount);
-        const labelInfo = op.label
+    renderPieChart(pieIncome, selectPieData(labels, labels.income), "This month's income");
+    renderPieChart(pieExpenses, selectPieData(labels, labels.expenses), "This month's expenses");
+}
 
-        if (opAmount > 0) {
-            addPieData(incomeData, labelInfo, opAmount);
-        } else {
-            addPieData(expensesData, labelInfo, opAmount);
+function selectPieData(labels, totals) {
+    // The payload is columnar: the n-th total belongs to the n-th label.
+    let data = {};
+    totals.forEach((amount, i) => {
+        if (amount > 0) {
+            data[labels.ids[i]] = {
+                amount: amount,
+                label: labels.names[i]
+            };
         }
     });
 
-    renderPieChart(pieIncome, incomeData, "This month's income");
-    renderPieChart(pieExpenses, expensesData, "This month's expenses");
-}
-
-function addPieData(data, labelInfo, amount) {
-    const labelId = labelInfo[0];
-    const labelName = labelInfo[1];
-
-    if (data.hasOwnProperty(labelId)) {
-        data[labelId].amount += Math.abs(amount);
-    } else {
-        data[labelId] = {
-            amount: Math.abs(amount),
-            label: labelName
-        };
-    }
+    return data;
 }
 
 function renderPieChart(target, chartData, title) {
@@ -78,10 +64,7 @@ function createBarChart() {
     //Yearly Chart:
     const barChart = document.getElementById('barChart').getContext('2d');
 
-    const incomeByMonth = document.getElementById('income').innerHTML.split(",");
-    const expensesByMonth = document.getElementById('expenses').innerHTML.split(",");
-
-    renderBarChart(barChart, incomeByMonth, expensesByMonth);
+    renderBarChart(barChart, chartData.months.income, chartData.months.expenses);
 }
 
 function renderBarChart(target, income, expenses) {
@@ -127,17 +110,12 @@ function renderBarChart(target, income, expenses) {
 }
 
 function getCurrency() {
-    let curr = document.getElementById("currency").innerHTML;
-
-    if (curr == null) {
-        curr = "";
-    } else {
-        curr = `, ${curr}`;
-    }
+    const curr = chartData.currency;
 
-    return curr;
+    return curr ? `, ${curr}` : "";
 }
 
+const chartData = JSON.parse(document.getElementById('chartData').textContent);
 const currency = getCurrency();
 const colours = ['rgba(114, 147, 203, 1)', 'rgba(225, 151, 76, 1)', 'rgba(132, 186, 91 , 1)', 'rgba(211, 94, 96, 1)', 'rgba(128, 133, 133, 1)', 'rgba(144, 103, 167, 1)', 'rgba(171, 104, 87, 1)', 'rgba(204, 194, 16, 1)'];
 const months = ['January', 'Febuary', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'];
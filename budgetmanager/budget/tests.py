@@ -1,18 +1,56 @@
+import csv
+import decimal
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 import time
-from django.test import TestCase
+import tracemalloc
+from unittest import skipUnless
+from uuid import uuid4
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
 from django.utils import timezone
-from django.db.utils import Error, IntegrityError
+from django.db.utils import Error, IntegrityError, OperationalError
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
 
 # Create your tests here.
 from django.test import TestCase
 from .models import *
+from .views import OpHistoryView
+from .middleware import AccountContext
+from . import benchmarks, cache, exports, imports, metrics, profiling, roles, timing, urls, views
+from .registry import Registry
+from .transfers import TransferError, collect, split, split_evenly, transfer
 from .utils import today
 
 from freezegun import freeze_time
 
 
+def retry_locked(func):
+    """Calls the function retrying when the database is locked.
+    SQLite allows only one writer at a time and reports the conflict instead of waiting.
+    """
+
+    while True:
+        try:
+            return func()
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            time.sleep(0.001)
+
+
 class PlanCommandTest(TestCase):
 
     def setUp(self):
@@ -26,14 +64,14 @@ class PlanCommandTest(TestCase):
 
         user1 = User(username='user1', password='asdfzxcv1234')
         user1.save()
-        Home.create_home(home_name='home1', user=user1)
+        Home.create_home(home_name='home1', user=user1, currency=Home.Currency.USD)
         plan1 = OperationPlan(account=user1.account, amount=1,
                               period='D', period_count=1, next_date=self.dates['D'])
         plan1.save()
 
         user2 = User(username='user2', password='asdfzxcv1234')
         user2.save()
-        Home.create_home(home_name='home2', user=user2)
+        Home.create_home(home_name='home2', user=user2, currency=Home.Currency.USD)
         plan2 = OperationPlan(account=user2.account, amount=2,
                               period='M', period_count=1, next_date=self.dates['M'])
         plan2.save()
@@ -88,3 +126,1841 @@ class PlanCommandTest(TestCase):
             #self.assertEqual(ops2.first().amount, plan2.amount, 'Amounts for user2 not equal.')
             self.assertEqual(
                 plan2.next_date, self.dates['M'], 'Wrong next_date for user2.')
+
+
+class BalanceAggregationTest(TestCase):
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        self.account = Home.create_home(
+            home_name='home1', user=user, currency=Home.Currency.USD).admin
+
+    def _add_history(self, count: int):
+        """Bulk inserts `count` operations bypassing the balance updates. Every other one is finalized."""
+
+        Operation.objects.bulk_create([
+            Operation(account=self.account, amount=decimal.Decimal('0.10'),
+                      final_date=today() if i % 2 else None)
+            for i in range(count)])
+
+    def _recalculation_peak(self):
+        """Returns the peak memory allocated while recalculating the account amounts."""
+
+        tracemalloc.start()
+        self.account.recalculate_amounts()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return peak
+
+    def test_exact_decimal_amounts(self):
+        self._add_history(1000)
+
+        self.assertEqual(self.account.calculate_final(), decimal.Decimal('100.00'))
+        self.assertEqual(self.account.calculate_current(), decimal.Decimal('50.00'))
+
+        self.account.recalculate_amounts()
+        self.account.refresh_from_db()
+
+        self.assertEqual(self.account.final_amount, decimal.Decimal('100.00'))
+        self.assertEqual(self.account.current_amount, decimal.Decimal('50.00'))
+
+    def test_empty_account(self):
+        self.assertEqual(self.account.calculate_final(), 0)
+        self.assertEqual(self.account.calculate_current(), 0)
+
+    def test_single_query(self):
+        self._add_history(100)
+
+        with self.assertNumQueries(1):
+            self.account.calculate_final()
+
+    def test_constant_memory(self):
+        self._add_history(10)
+        self._recalculation_peak()  # Warm up the query compilation caches.
+        small_peak = self._recalculation_peak()
+
+        self._add_history(5000)
+        large_peak = self._recalculation_peak()
+
+        self.assertLess(large_peak, small_peak * 2,
+                        'Recalculation memory grows with the operation history.')
+
+
+class MonthlySummaryTest(TestCase):
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        home = Home.create_home(
+            home_name='home1', user=user, currency=Home.Currency.USD)
+        self.account = home.admin
+        self.label = home.get_labels().get(name='Food')
+
+    def _month_summary(self, label: Label = None):
+        return MonthlySummary.objects.get(
+            account=self.account, label=label, month=today().replace(day=1))
+
+    def test_save_and_delete(self):
+        Operation(account=self.account, amount=10, final_date=today(), label=self.label).save()
+        op = Operation(account=self.account, amount=-4, final_date=today(), label=self.label)
+        op.save()
+        Operation(account=self.account, amount=100).save()
+
+        summary = self._month_summary(self.label)
+        self.assertEqual(summary.income, 10)
+        self.assertEqual(summary.expenses, 4)
+
+        op.delete()
+        summary.refresh_from_db()
+        self.assertEqual(summary.expenses, 0)
+
+    def test_finalize(self):
+        op = Operation(account=self.account, amount=7)
+        op.save()
+        self.assertFalse(MonthlySummary.objects.exists())
+
+        op.finalize()
+        self.assertEqual(self._month_summary().income, 7)
+
+    def test_label_delete(self):
+        Operation(account=self.account, amount=5, final_date=today(), label=self.label).save()
+        Operation(account=self.account, amount=3, final_date=today()).save()
+
+        self.label.delete()
+        self.assertEqual(self._month_summary().income, 8)
+        self.assertEqual(MonthlySummary.verify(), [])
+
+    def test_charts_read_summaries(self):
+        Operation(account=self.account, amount=10, final_date=today()).save()
+        Operation(account=self.account, amount=-2, final_date=today(), label=self.label).save()
+
+        month = today().month - 1
+        with self.assertNumQueries(1):
+            self.assertEqual(self.account.get_this_year_income()[month], 10.0)
+        self.assertEqual(self.account.get_this_year_expenses()[month], 2.0)
+
+    def test_rebuild_command(self):
+        Operation(account=self.account, amount=10, final_date=today(), label=self.label).save()
+        Operation(account=self.account, amount=-2, final_date=today()).save()
+        expected = set(MonthlySummary.objects.values_list('account', 'label', 'month', 'income', 'expenses'))
+
+        MonthlySummary.objects.update(income=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuildsummaries', check=True, stdout=StringIO(), stderr=StringIO())
+
+        call_command('rebuildsummaries', stdout=StringIO())
+        self.assertEqual(
+            set(MonthlySummary.objects.values_list('account', 'label', 'month', 'income', 'expenses')), expected)
+
+
+class PlanMaterializationTest(TestCase):
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        self.account = Home.create_home(
+            home_name='home1', user=user, currency=Home.Currency.USD).admin
+        self.start = today()
+
+    def _plan(self, period: str, period_count: int = 1):
+        plan = OperationPlan(account=self.account, amount=-2,
+                             period=period, period_count=period_count, next_date=self.start)
+        plan.save()
+        return plan
+
+    def test_due_dates(self):
+        plan = self._plan('W', 2)
+        dates = plan.get_due_dates(self.start + timedelta(days=30))
+
+        self.assertEqual(dates, [self.start + timedelta(days=14 * i) for i in range(3)])
+        self.assertEqual(plan.get_due_dates(self.start - timedelta(days=1)), [])
+
+    def test_year_overdue_daily_plan(self):
+        plan = self._plan('D')
+
+        with freeze_time(self.start + timedelta(days=364)):
+            with CaptureQueriesContext(connection) as queries:
+                ops = plan.materialize()
+
+            self.assertEqual(len(ops), 365)
+            self.assertLess(len(queries), 20, 'Materialization does not use bulk queries.')
+
+            plan.refresh_from_db()
+            self.account.refresh_from_db()
+            self.assertEqual(plan.next_date, self.start + timedelta(days=365))
+            self.assertEqual(Operation.objects.filter(plan=plan).count(), 365)
+            self.assertEqual(self.account.final_amount, -730)
+            self.assertEqual(self.account.current_amount, 0)
+
+    def test_materialize_once(self):
+        plan = self._plan('D')
+        stale = OperationPlan.objects.get(id=plan.id)
+
+        with freeze_time(self.start + timedelta(days=9)):
+            self.assertEqual(len(plan.materialize()), 10)
+            self.assertEqual(stale.materialize(), [])
+
+            self.assertEqual(Operation.objects.filter(plan=plan).count(), 10)
+
+
+class PlanWatermarkTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.account = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD).admin
+        self.start = today()
+
+    def _plan(self, next_date: date):
+        plan = OperationPlan(account=self.account, amount=1,
+                             period='D', period_count=1, next_date=next_date)
+        plan.save()
+        return plan
+
+    def test_watermark_follows_plans(self):
+        self.assertIsNone(self.account.next_plan_date)
+
+        later = self._plan(self.start + timedelta(days=5))
+        earlier = self._plan(self.start + timedelta(days=2))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.next_plan_date, earlier.next_date)
+
+        earlier.delete()
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.next_plan_date, later.next_date)
+
+        with freeze_time(self.start + timedelta(days=7)):
+            later.materialize()
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.next_plan_date, self.start + timedelta(days=8))
+
+    def test_reads_do_not_materialize(self):
+        self._plan(self.start)
+
+        with CaptureQueriesContext(connection) as queries:
+            list(self.account.get_operations())
+
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(Operation.objects.exists())
+
+        self.assertTrue(self.account.has_due_plans())
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/user').status_code, 200)
+        self.assertFalse(Operation.objects.exists())
+
+        call_command('planoperations', stdout=StringIO())
+        self.assertEqual(Operation.objects.count(), 1)
+
+    def test_missing_watermark(self):
+        OperationPlan.objects.bulk_create([OperationPlan(
+            account=self.account, amount=1, period='D', period_count=1, next_date=self.start - timedelta(days=1))])
+        self.account.refresh_from_db()
+        self.assertIsNone(self.account.next_plan_date)
+
+        call_command('planoperations', stdout=StringIO())
+
+        self.assertEqual(Operation.objects.count(), 2)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.next_plan_date, self.start + timedelta(days=1))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The query plans are checked with SQLite EXPLAIN QUERY PLAN.')
+class QueryIndexTest(TestCase):
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+    def assertUsesIndex(self, qset, index: str):
+        plan = qset.explain()
+        self.assertIn(index, plan, f'Query does not use {index}:\n{plan}')
+
+    def test_operation_indexes(self):
+        td = today()
+
+        self.assertUsesIndex(self.account.get_operations()[:5], 'operation_account_created_idx')
+        self.assertUsesIndex(
+            Operation.objects.filter(account=self.account).filter(
+                final_date__gte=td.replace(day=1)).filter(final_date__lte=td),
+            'operation_account_final_idx')
+        self.assertUsesIndex(
+            Operation.objects.filter(account=self.account).filter(final_date=None),
+            'operation_unfinalized_idx')
+
+    def test_plan_indexes(self):
+        self.assertUsesIndex(
+            OperationPlan.objects.filter(account=self.account).filter(next_date__lte=today()),
+            'plan_account_next_date_idx')
+        self.assertUsesIndex(
+            Account.objects.filter(next_plan_date__lte=today()), 'account_next_plan_idx')
+
+    def test_label_index(self):
+        self.assertUsesIndex(
+            Label.objects.filter(home=self.home).filter(account=None).filter(name='Food'),
+            'label_home_account_name_idx')
+
+
+class AtomicBalanceTest(TestCase):
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        self.account = Home.create_home(
+            home_name='home1', user=user, currency=Home.Currency.USD).admin
+
+    def test_stale_instances(self):
+        first = Account.objects.get(id=self.account.id)
+        second = Account.objects.get(id=self.account.id)
+
+        Operation(account=first, amount=decimal.Decimal('1.10'), final_date=today()).save()
+        Operation(account=second, amount=decimal.Decimal('2.20')).save()
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.final_amount, decimal.Decimal('3.30'))
+        self.assertEqual(self.account.current_amount, decimal.Decimal('1.10'))
+
+    def test_only_amounts_updated(self):
+        with CaptureQueriesContext(connection) as queries:
+            Operation(account=self.account, amount=5).save()
+
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('auth_user', updates[0])
+        self.assertNotIn('home_id', updates[0])
+
+    def test_clamping(self):
+        Operation(account=self.account, amount=Account.MAX_AMOUNT).save()
+        Operation(account=self.account, amount=Account.MAX_AMOUNT).save()
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.final_amount, Account.MAX_AMOUNT)
+
+        self.account.apply_amounts(final=-3 * Account.MAX_AMOUNT)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.final_amount, -Account.MAX_AMOUNT)
+
+
+    def test_save_keeps_concurrent_amounts(self):
+        stale = Account.objects.get(id=self.account.id)
+        self.account.apply_amounts(final=5, current=5)
+
+        stale.user.first_name = 'Renamed'
+        stale.save()
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.user.first_name, 'Renamed')
+        self.assertEqual(self.account.final_amount, decimal.Decimal('5.00'))
+        self.assertEqual(self.account.current_amount, decimal.Decimal('5.00'))
+
+        Operation.objects.filter(account=self.account).delete()
+        stale.recalculate_amounts()
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.final_amount, decimal.Decimal('0.00'))
+
+
+class ConcurrentBalanceTest(TransactionTestCase):
+
+    THREADS = 8
+    OPERATIONS = 25
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        self.account_id = Home.create_home(
+            home_name='home1', user=user, currency=Home.Currency.USD).admin.id
+
+    def _insert_operations(self):
+        try:
+            for _ in range(self.OPERATIONS):
+                retry_locked(self._insert_operation)
+        finally:
+            connection.close()
+
+    def _insert_operation(self):
+        account = Account.objects.get(id=self.account_id)
+        Operation(account=account, amount=decimal.Decimal('0.01'), final_date=today()).save()
+
+    def test_parallel_inserts(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            futures = [executor.submit(self._insert_operations) for _ in range(self.THREADS)]
+            for future in futures:
+                future.result()
+
+        account = Account.objects.get(id=self.account_id)
+        expected = decimal.Decimal('0.01') * self.THREADS * self.OPERATIONS
+
+        self.assertEqual(account.final_amount, expected)
+        self.assertEqual(account.current_amount, expected)
+        self.assertEqual(account.calculate_final(), expected)
+
+
+class BulkFinalizeTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = home.admin
+        self.label = home.get_labels().get(name='Food')
+
+        self.ops = []
+        for amount in (5, -2, 10, -1):
+            op = Operation(account=self.account, amount=amount, label=self.label)
+            op.save()
+            self.ops.append(op)
+
+    def test_finalize_all(self):
+        with CaptureQueriesContext(connection) as queries:
+            count = self.account.finalize_operations()
+
+        self.assertEqual(count, 4)
+        op_updates = [q for q in queries if q['sql'].startswith('UPDATE "budget_operation"')]
+        self.assertEqual(len(op_updates), 1)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_amount, 12)
+        self.assertEqual(self.account.calculate_current(), 12)
+        self.assertFalse(Operation.objects.filter(final_date=None).exists())
+        self.assertEqual(MonthlySummary.verify(), [])
+
+    def test_finalize_selected(self):
+        other = User(username='user2', password='asdfzxcv1234')
+        other.save()
+        other_op = Operation(account=Home.create_home(
+            home_name='home2', user=other, currency=Home.Currency.USD).admin, amount=3)
+        other_op.save()
+
+        self.client.force_login(self.user)
+        self.client.post('/user/history', {'fin_selected': '0',
+                                           'fin_ids': [self.ops[0].id, self.ops[1].id, other_op.id]})
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_amount, 3)
+        self.assertEqual(Operation.objects.filter(final_date=None).count(), 3)
+        self.assertEqual(MonthlySummary.verify(), [])
+
+
+class HistoryPaginationTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.account = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD).admin
+
+        for day in range(3):
+            with freeze_time(today() - timedelta(days=day)):
+                Operation.objects.bulk_create(
+                    [Operation(account=self.account, amount=i) for i in range(20)])
+
+        self.client.force_login(self.user)
+
+    def test_pages_cover_history(self):
+        seen = []
+        cursor = None
+        while True:
+            operations, cursor = self.account.get_operations_page(cursor=cursor, size=7)
+            seen.extend(op.id for op in operations)
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, list(self.account.get_operations().values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        operations, _ = self.account.get_operations_page(cursor='invalid', size=5)
+        self.assertEqual(len(operations), 5)
+
+    def test_fragments(self):
+        response = self.client.get('/user/history')
+        self.assertEqual(response.content.count(b'class="accordion-item"'), OpHistoryView.page_size)
+
+        response = self.client.get('/user/history/page', {'cursor': response.context['next_cursor']})
+        self.assertEqual(response.content.count(b'class="accordion-item"'), OpHistoryView.page_size)
+
+        response = self.client.get('/user/history/page', {'cursor': response['X-Next-Cursor']})
+        self.assertEqual(response.content.count(b'class="accordion-item"'), 60 - 2 * OpHistoryView.page_size)
+        self.assertNotIn('X-Next-Cursor', response)
+
+        op = self.account.get_operations().last()
+        response = self.client.get(f'/user/history/{op.id}')
+        self.assertContains(response, f'finalizeOperation{op.id}')
+
+    def test_foreign_detail(self):
+        other = User(username='user2', password='asdfzxcv1234')
+        other.save()
+        account = Home.create_home(home_name='home2', user=other, currency=Home.Currency.USD).admin
+        op = Operation(account=account, amount=1)
+        op.save()
+
+        self.assertEqual(self.client.get(f'/user/history/{op.id}').status_code, 404)
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+        self.label = self.home.get_labels().get(name='Food')
+
+        member = User(username='user2', password='asdfzxcv1234')
+        member.save()
+        self.member = Account(user=member, home=self.home)
+        self.member.save()
+
+        Operation.objects.bulk_create(
+            [Operation(account=self.account, amount=i, label=self.label if i % 2 else None,
+                       description=f'op, "{i}"') for i in range(10)]
+            + [Operation(account=self.member, amount=1)])
+
+        self.client.force_login(self.user)
+
+    def _export(self, **params):
+        response = self.client.get('/user/export', params)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.DictReader(StringIO(self._export(format='csv'))))
+
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[3]['description'], 'op, "3"')
+        self.assertEqual(rows[3]['label'], 'Food')
+
+    def test_jsonl_filters(self):
+        lines = self._export(format='jsonl', label=self.label.id).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['username'], 'user1')
+
+        lines = self._export(format='jsonl', scope='home').splitlines()
+        self.assertEqual(len(lines), 11)
+
+        lines = self._export(format='jsonl', start=today() + timedelta(days=1)).splitlines()
+        self.assertEqual(lines, [])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/user/export', {'format': 'xml'}).status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('exportops', format='jsonl', account='user2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+        out = StringIO()
+        call_command('exportops', home=self.home.id, chunk_size=3, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 12)
+
+    def test_constant_memory(self):
+        qset = Operation.objects.all()
+
+        def export_peak():
+            tracemalloc.start()
+            for _ in exports.iter_csv(qset, chunk_size=100):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        export_peak()
+        small_peak = export_peak()
+
+        Operation.objects.bulk_create([Operation(account=self.account, amount=1) for _ in range(5000)])
+        large_peak = export_peak()
+
+        self.assertLess(large_peak, small_peak * 3, 'Export memory grows with the operation count.')
+
+
+class ImportTest(TestCase):
+
+    STATEMENT = (
+        'date,amount,description,label\n'
+        '{day},-12.50,Groceries,food\n'
+        '{day},100.00,Salary,\n'
+        '{day},-12.50,Groceries,food\n'
+        'yesterday,1.00,Invalid date,\n'
+        '{day},-3.10,"Bus, ticket",\n'
+    )
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = home.admin
+        self.label = home.get_labels().get(name='Food')
+
+    def _lines(self):
+        return StringIO(self.STATEMENT.format(day=today().isoformat()))
+
+    def test_import(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = imports.import_operations(self.account, self._lines(), batch_size=2)
+
+        self.assertEqual((result.created, result.duplicates, result.invalid), (3, 1, 1))
+        self.assertEqual(result.errors, [(5, 'Invalid date.')])
+        # One insert per batch with new rows, the second batch only has a duplicate and an invalid row.
+        self.assertEqual(len([q for q in queries if 'INSERT INTO "budget_operation"' in q['sql']]), 2)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.final_amount, decimal.Decimal('84.40'))
+        self.assertEqual(self.account.current_amount, decimal.Decimal('84.40'))
+        self.assertEqual(Operation.objects.get(description='Groceries').label, self.label)
+        self.assertEqual(MonthlySummary.verify(), [])
+
+    def test_error_lines(self):
+        lines = StringIO(
+            'date,amount,description,label\n'
+            f'{today().isoformat()},-1.00,First,\n'
+            'yesterday,-2.00,Invalid date,\n'
+            f'{today().isoformat()},-3.00,Third,\n'
+            f'{today().isoformat()},nothing,Invalid amount,\n'
+            f'{today().isoformat()},-5.00,Fifth,\n')
+
+        result = imports.import_operations(self.account, lines)
+
+        self.assertEqual((result.created, result.invalid), (3, 2))
+        self.assertEqual([line for line, _ in result.errors], [3, 5])
+
+    def test_reimport_skips_duplicates(self):
+        imports.import_operations(self.account, self._lines())
+        result = imports.import_operations(self.account, self._lines())
+
+        self.assertEqual((result.created, result.duplicates), (0, 4))
+        self.assertEqual(Operation.objects.count(), 3)
+
+    def test_upload(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('statement.csv', self._lines().getvalue().encode())
+        self.client.post('/user/history', {'import_ops': '', 'file': upload})
+
+        self.assertEqual(Operation.objects.filter(account=self.account).count(), 3)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(self._lines().getvalue())
+
+        try:
+            call_command('importops', 'user1', file.name, stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(file.name)
+
+        self.assertEqual(Operation.objects.filter(account=self.account).count(), 3)
+
+
+class OperationListQueryTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+        self.label = self.home.get_labels().get(name='Food')
+
+        member = User(username='user2', first_name='Member', password='asdfzxcv1234')
+        member.save()
+        self.member = Account(user=member, home=self.home)
+        self.member.save()
+
+        self.client.force_login(self.user)
+
+    def _add_operations(self, count: int):
+        for i in range(count):
+            Operation(account=self.account, amount=1, label=self.label).save()
+            self.account.make_transaction(self.member, 1, 'Sent')
+            self.member.make_transaction(self.account, 2, 'Received')
+
+    def _count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+
+        return len(queries)
+
+    def _render_history(self):
+        operations, _ = self.account.get_operations_page()
+        for op in operations:
+            render_to_string('budget/user/lists/history_rows.html', {'operations': [op]})
+            render_to_string('budget/user/history_detail.html', {'op': op})
+
+    def test_counterparty(self):
+        self._add_operations(1)
+        ops = {op.description: op for op in self.account.get_operation_list().exclude(description=None)}
+
+        self.assertEqual(ops['Sent'].direction, 'out')
+        self.assertEqual(ops['Sent'].get_counterparty_name(), 'Member (user2)')
+        self.assertEqual(ops['Received'].direction, 'in')
+        self.assertEqual(ops['Received'].currency_amount(), f'2.00 {Home.Currency.USD}')
+
+    def test_history_queries(self):
+        self._add_operations(1)
+        with self.assertNumQueries(1):
+            self._render_history()
+
+        self._add_operations(5)
+        with self.assertNumQueries(1):
+            self._render_history()
+
+    def test_page_queries(self):
+        self._add_operations(1)
+        self.account.get_roles()  # Both measurements use the cached roles
+        small = {url: self._count_queries(lambda: self.client.get(url))
+                 for url in ('/user', '/user/history')}
+
+        self._add_operations(10)
+        large = {url: self._count_queries(lambda: self.client.get(url))
+                 for url in ('/user', '/user/history')}
+
+        self.assertEqual(small, large)
+
+
+class AccountContextTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        member = User(username='user2', password='asdfzxcv1234')
+        member.save()
+        self.member = Account(user=member, home=self.home)
+        self.member.save()
+
+        other = User(username='user3', password='asdfzxcv1234')
+        other.save()
+        self.other = Home.create_home(
+            home_name='home2', user=other, currency=Home.Currency.USD).admin
+
+    def _load(self, user, view_as=None):
+        request = RequestFactory().get('/')
+        request.user = user
+        request.session = {'view_as': view_as} if view_as else {}
+
+        return AccountContext.load(request)
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            context = self._load(self.user)
+            self.assertEqual(context.home.name, 'home1')
+            self.assertEqual(context.user.account.home, self.home)
+
+        self.assertEqual(context.account, self.account)
+        self.assertTrue(context.is_admin)
+        self.assertEqual(context.is_mod, self.account.is_mod())
+        self.assertFalse(context.is_view_as)
+
+    def test_roles(self):
+        self.assertFalse(self._load(self.member.user).is_mod)
+        self.home.add_mod(self.member)
+
+        context = self._load(self.member.user)
+        self.assertFalse(context.is_admin)
+        self.assertTrue(context.is_mod)
+
+    def test_view_as(self):
+        with self.assertNumQueries(1):
+            context = self._load(self.user, view_as='user2')
+            self.assertEqual(context.user.username, 'user2')
+
+        self.assertTrue(context.is_view_as)
+        self.assertEqual(context.account, self.member)
+        self.assertEqual(context.actual_account, self.account)
+        self.assertFalse(context.is_admin)
+
+    def test_view_as_other_home(self):
+        context = self._load(self.user, view_as='user3')
+
+        self.assertFalse(context.is_view_as)
+        self.assertEqual(context.account, self.account)
+
+    def test_no_account(self):
+        user = User(username='user4', password='asdfzxcv1234')
+        user.save()
+
+        self.assertIsNone(self._load(user).account)
+        self.client.force_login(user)
+        self.assertRedirects(self.client.get('/user'), '/', fetch_redirect_response=False)
+
+
+class RoleResolverTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        self.members = []
+        for i in range(3):
+            user = User(username=f'member{i}', password='asdfzxcv1234')
+            user.save()
+            account = Account(user=user, home=self.home)
+            account.save()
+            self.members.append(account)
+
+    def test_roster_queries(self):
+        accounts = list(Account.objects.filter(home=self.home).select_related('user'))
+        self.addCleanup(roles.deactivate, roles.activate())
+        with self.assertNumQueries(3):
+            titles = [account.get_title() for account in accounts]
+            perms = [account.get_perms() for account in accounts]
+
+        self.assertEqual(titles, ['[Administrator]', '', '', ''])
+        self.assertEqual(perms[1], [])
+
+        with self.assertNumQueries(0):
+            for account in accounts:
+                account.get_title()
+                account.is_mod()
+
+    def test_invalidation(self):
+        member = self.members[0]
+        self.assertFalse(member.is_mod())
+        self.assertFalse(member.has_perm('budget.manage_home_labels'))
+
+        self.home.add_mod(member)
+        self.assertTrue(member.is_mod())
+        self.assertTrue(member.has_perm('budget.manage_home_labels'))
+        self.assertEqual(member.get_title(), '[Moderator]')
+
+        member.add_perm('manage_users')
+        self.assertTrue(member.has_perm('budget.manage_users'))
+        member.remove_perm('manage_users')
+        self.assertFalse(member.has_perm('budget.manage_users'))
+
+        self.home.remove_mod(member)
+        self.assertFalse(member.is_mod())
+
+        self.home.change_admin(member)
+        self.assertTrue(member.is_admin())
+        self.assertFalse(self.account.is_admin())
+
+    def test_matches_user_perms(self):
+        member = self.members[1]
+        self.home.add_mod(member)
+        member.add_perm('plan_for_others')
+        user = User.objects.get(id=member.user_id)
+
+        for perm in Permission.objects.filter(content_type__app_label='budget'):
+            codename = f'budget.{perm.codename}'
+            self.assertEqual(member.has_perm(codename), user.has_perm(codename), codename)
+
+    def test_changed_by_other_process(self):
+        member = self.members[0]
+        self.assertFalse(member.has_perm('budget.manage_users'))
+
+        # Another process changes the permissions and the version, but not the local cache
+        member.user.user_permissions.add(Permission.objects.get(codename='manage_users'))
+        Home.objects.filter(id=self.home.id).update(roles_version=uuid4())
+
+        self.assertTrue(member.has_perm('budget.manage_users'))
+
+    def test_membership_change(self):
+        self.assertEqual(len(roles.get_roles(self.home.id).groups), 4)
+        self.members[2].delete()
+        self.assertEqual(len(roles.get_roles(self.home.id).groups), 3)
+
+
+class RegistryTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        member = User(username='user2', password='asdfzxcv1234')
+        member.save()
+        self.member = Account(user=member, home=self.home)
+        self.member.save()
+
+    def _queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+
+        return [query['sql'] for query in queries]
+
+    def test_transaction_lookups(self):
+        sql = self._queries(lambda: self.account.make_transaction(self.member, 10, 'Test'))
+
+        self.assertFalse([query for query in sql if query.startswith('SELECT') and '"budget_label"' in query])
+        self.assertEqual(self.member.get_operations().get().label, Label.get_global('Internal'))
+
+    def test_role_lookups(self):
+        def change_roles():
+            self.home.add_mod(self.member)
+            self.member.add_perm('manage_users')
+            self.home.remove_mod(self.member)
+
+        sql = self._queries(change_roles)
+
+        self.assertFalse([query for query in sql if 'FROM "auth_group"' in query])
+        self.assertFalse([query for query in sql if 'FROM "auth_permission"' in query])
+
+    def test_warm_up(self):
+        for name in (ADMIN_GROUP, MOD_GROUP):
+            group = Group.objects.get(name=name)
+            self.assertEqual(Home.get_group_id(name), group.id)
+
+        self.assertEqual(set(Group.objects.get(name=MOD_GROUP).permissions.values_list('codename', flat=True)),
+                         {perm[0] for perm in BASE_MOD_PERMS})
+        self.assertTrue(Label.objects.filter(id=Label.get_global_id('Internal'), home=None).exists())
+
+    def test_single_load(self):
+        registry = Registry()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.01)
+            return 1
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: registry.get('key', loader), range(16)))
+
+        self.assertEqual(results, [1] * 16)
+        self.assertEqual(len(calls), 1)
+
+
+class HomeRosterTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        self.client.force_login(self.user)
+
+    def _add_members(self, count: int):
+        members = []
+        for i in range(count):
+            user = User(username=f'member{Account.objects.count()}', password='asdfzxcv1234')
+            user.save()
+            account = Account(user=user, home=self.home)
+            account.save()
+            Operation(account=account, amount=10, final_date=today()).save()
+            members.append(account)
+
+        return members
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/home')
+
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_roster(self):
+        member = self._add_members(1)[0]
+        self.home.add_mod(member)
+        Operation(account=member, amount=-4, final_date=today()).save()
+
+        roster = {account.id: account for account in Account.objects.filter(home=self.home).for_roster()}
+
+        self.assertEqual(roster[self.account.id].role, 'admin')
+        self.assertEqual(roster[member.id].role, 'mod')
+        self.assertEqual(roster[member.id].get_title(), '[Moderator]')
+        self.assertEqual(roster[member.id].month_income, 10)
+        self.assertEqual(roster[member.id].month_expenses, 4)
+        self.assertEqual(roster[self.account.id].month_income, 0)
+
+    def test_home_queries(self):
+        self._add_members(1)
+        small = self._count_queries()
+
+        self._add_members(Home.MAX_ACCOUNTS - 2)
+        self.assertEqual(self._count_queries(), small)
+
+    def test_shared_transaction_modal(self):
+        self._add_members(3)
+        content = self.client.get('/home').content.decode()
+
+        self.assertEqual(content.count('id="transactionModal"'), 1)
+        self.assertEqual(content.count('data-account-id='), 3)
+
+
+class TransferTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        member = User(username='user2', password='asdfzxcv1234')
+        member.save()
+        self.member = Account(user=member, home=self.home)
+        self.member.save()
+
+    def test_transfer(self):
+        outcoming, incoming = transfer(self.account, self.member, '12.50', 'Rent')
+
+        self.assertEqual(incoming.source, outcoming)
+        self.assertEqual(Operation.objects.get(id=outcoming.id).destination.id, incoming.id)
+        self.assertEqual(outcoming.amount, decimal.Decimal('-12.50'))
+        self.assertEqual(self.account.current_amount, decimal.Decimal('-12.50'))
+
+        for account, expected in ((self.account, '-12.50'), (self.member, '12.50')):
+            account = Account.objects.get(id=account.id)
+            self.assertEqual(account.final_amount, decimal.Decimal(expected))
+            self.assertEqual(account.current_amount, decimal.Decimal(expected))
+            self.assertEqual(account.calculate_final(), decimal.Decimal(expected))
+
+        self.assertEqual(MonthlySummary.verify(), [])
+
+    def test_queries(self):
+        transfer(self.account, self.member, 1)
+        with CaptureQueriesContext(connection) as queries:
+            transfer(self.account, self.member, 1)
+
+        writes = [query['sql'] for query in queries if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len([sql for sql in writes if sql.startswith('UPDATE "budget_account"')]), 1)
+        self.assertEqual(len([sql for sql in writes if sql.startswith('INSERT INTO "budget_operation"')]), 2)
+        self.assertFalse([sql for sql in writes if '"auth_user"' in sql])
+
+    def test_invalid(self):
+        other = Home.create_home(home_name='home2', user=User.objects.create(username='user3'),
+                                 currency=Home.Currency.USD).admin
+
+        for destination, amount in ((self.member, 0), (self.member, -5), (self.member, 'abc'),
+                                    (self.account, 5), (other, 5)):
+            with self.assertRaises(TransferError):
+                transfer(self.account, destination, amount)
+
+        self.assertFalse(Operation.objects.exists())
+
+    def test_make_transaction(self):
+        outcoming, incoming = self.account.make_transaction(self.member, 3, 'Test')
+
+        self.assertEqual(incoming.label, Label.get_global('Internal'))
+        self.assertEqual(Account.objects.get(id=self.member.id).current_amount, 3)
+
+
+class ConcurrentTransferTest(TransactionTestCase):
+
+    def setUp(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        home = Home.create_home(home_name='home1', user=user, currency=Home.Currency.USD)
+        self.account_ids = [home.admin.id]
+        for i in range(2, 5):
+            member = User(username=f'user{i}', password='asdfzxcv1234')
+            member.save()
+            account = Account(user=member, home=home)
+            account.save()
+            self.account_ids.append(account.id)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchtransfers', accounts=4, threads=4, transfers=10, stdout=out)
+
+        self.assertIn('40 transfers', out.getvalue())
+        self.assertEqual(Home.objects.count(), 1)
+
+    def test_opposite_transfers(self):
+        first, second = self.account_ids[:2]
+
+        def run(source_id, destination_id):
+            try:
+                for _ in range(20):
+                    retry_locked(lambda: transfer(
+                        Account.objects.get(id=source_id), Account.objects.get(id=destination_id), 1))
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(run, *pair) for pair in ((first, second), (second, first)) * 2]
+            for future in futures:
+                future.result()
+
+        accounts = Account.objects.filter(id__in=[first, second])
+        for account in accounts:
+            self.assertEqual(account.final_amount, 0)
+            self.assertEqual(account.calculate_current(), 0)
+        self.assertEqual(Operation.objects.count(), 160)
+
+
+class SplitTransferTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        self.members = []
+        for i in range(2, 5):
+            user = User(username=f'user{i}', password='asdfzxcv1234')
+            user.save()
+            account = Account(user=user, home=self.home)
+            account.save()
+            self.members.append(account)
+
+        self.client.force_login(self.user)
+
+    def _balances(self):
+        return {account.id: account.final_amount for account in Account.objects.filter(home=self.home)}
+
+    def test_split_evenly(self):
+        self.assertEqual(split_evenly('10.00', 3), [decimal.Decimal('3.34'), decimal.Decimal('3.33'),
+                                                    decimal.Decimal('3.33')])
+        self.assertEqual(sum(split_evenly('0.05', 4)), decimal.Decimal('0.05'))
+
+    def test_split_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            pairs = split(self.account, [(member, 5) for member in self.members], 'Pizza')
+
+        self.assertEqual(len(pairs), 3)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "budget_operation"')]
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "budget_account"')]
+        self.assertEqual((len(inserts), len(updates)), (2, 1))
+
+        balances = self._balances()
+        self.assertEqual(balances[self.account.id], -15)
+        self.assertTrue(all(balances[member.id] == 5 for member in self.members))
+
+    def test_collect(self):
+        collect(self.account, [(self.members[0], 5), (self.members[1], '2.50')])
+
+        balances = self._balances()
+        self.assertEqual(balances[self.account.id], decimal.Decimal('7.50'))
+        self.assertEqual(balances[self.members[1].id], decimal.Decimal('-2.50'))
+
+    def test_invalid_leg_rolls_back(self):
+        with self.assertRaises(TransferError):
+            split(self.account, [(self.members[0], 5), (self.account, 5)])
+
+        self.assertFalse(Operation.objects.exists())
+        self.assertEqual(set(self._balances().values()), {0})
+
+    def test_home_form(self):
+        response = self.client.post('/home', {
+            'split': '', 'direction': 'collect', 'amount': '40.00', 'description': 'Groceries',
+            'members': [member.id for member in self.members], 'include_self': 'on'})
+
+        self.assertEqual(response.status_code, 302)
+        balances = self._balances()
+        self.assertEqual(balances[self.account.id], 30)
+        self.assertTrue(all(balances[member.id] == -10 for member in self.members))
+
+    def test_api(self):
+        legs = [{'account': member.id, 'amount': '1.25'} for member in self.members]
+        response = self.client.post('/api/transfers', {'direction': 'send', 'legs': legs},
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['transfers']), 3)
+        self.assertEqual(self._balances()[self.account.id], decimal.Decimal('-3.75'))
+
+    def test_api_errors(self):
+        other = Home.create_home(home_name='home2', user=User.objects.create(username='user9'),
+                                 currency=Home.Currency.USD).admin
+
+        for body in ({'legs': 'x'}, {'direction': 'steal', 'legs': []},
+                     {'legs': [{'account': other.id, 'amount': 1}]},
+                     {'legs': [{'account': self.members[0].id, 'amount': -1}]},
+                     {'legs': [{'account': self.members[0].id, 'amount': '1e30'}]},
+                     {'legs': [{'account': self.members[0].id, 'amount': '12345678.00'}]},
+                     {'legs': [{'account': self.members[0].id, 'amount': '1000000.00'}]}):
+            response = self.client.post('/api/transfers', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+        self.client.force_login(self.members[0].user)
+        response = self.client.post('/api/transfers', {'direction': 'collect', 'legs': [
+            {'account': self.account.id, 'amount': 1}]}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Operation.objects.exists())
+
+
+class ChartDataTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+        self.food = self.home.get_labels().get(name='Food')
+
+        self.client.force_login(self.user)
+
+    def _add_operations(self, count: int):
+        for _ in range(count):
+            Operation(account=self.account, amount=decimal.Decimal('-1.10'), label=self.food,
+                      final_date=today()).save()
+            Operation(account=self.account, amount=decimal.Decimal('2.20'), final_date=today()).save()
+            Operation(account=self.account, amount=decimal.Decimal('-5.00'), label=self.food).save()
+
+    def _chart_data(self):
+        return self.client.get('/user').context['chart_data']
+
+    def test_label_totals(self):
+        self._add_operations(3)
+
+        totals = {row[0]: row[1:] for row in self.account.get_this_month_label_totals()}
+        self.assertEqual(totals, {self.food.id: ('[Home] Food', 0, 3.3), None: (None, 6.6, 0)})
+
+        labels = self._chart_data()['labels']
+        self.assertEqual(labels['names'], ['No label', '[Home] Food'])
+        self.assertEqual(labels['ids'], [0, self.food.id])
+        self.assertEqual(labels['income'], [6.6, 0])
+
+    def test_payload_size(self):
+        self._add_operations(1)
+        small = json.dumps(self._chart_data())
+
+        self._add_operations(20)
+        large = json.dumps(self._chart_data())
+
+        # Only the digits of the totals grow
+        self.assertLessEqual(len(large) - len(small), 4)
+
+        content = self.client.get('/user').content.decode()
+        self.assertEqual(content.count('id="chartData"'), 1)
+
+
+class DashboardDataTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        member = User(username='user2', password='asdfzxcv1234')
+        member.save()
+        self.member = Account(user=member, home=self.home)
+        self.member.save()
+
+        self.client.force_login(self.user)
+
+    def _version(self, account: Account = None):
+        return Account.objects.values_list('version', flat=True).get(id=(account or self.account).id)
+
+    def _assert_bumped(self, func, account: Account = None):
+        version = self._version(account)
+        func()
+        self.assertGreater(self._version(account), version)
+
+    def test_version_bumps(self):
+        op = Operation(account=self.account, amount=5)
+        self._assert_bumped(op.save)
+        self._assert_bumped(op.finalize)
+        self._assert_bumped(lambda: Operation.objects.filter(id=op.id).get().delete())
+
+        self._assert_bumped(lambda: self.account.make_transaction(self.member, 1))
+        self._assert_bumped(lambda: self.account.make_transaction(self.member, 1), self.member)
+
+        plan = OperationPlan(account=self.account, amount=1, next_date=today() + timedelta(days=5),
+                             period=OperationPlan.TimePeriod.MONTH, period_count=1)
+        self._assert_bumped(plan.save)
+        self._assert_bumped(plan.delete)
+
+        label = Label(name='Test', home=self.home)
+        self._assert_bumped(label.save, self.member)
+        self._assert_bumped(label.delete)
+
+    def test_save_keeps_version(self):
+        stale = Account.objects.get(id=self.account.id)
+        Operation(account=self.account, amount=5).save()
+        version = self._version()
+
+        stale.save()
+        self.assertEqual(self._version(), version)
+
+    def test_data(self):
+        Operation(account=self.account, amount=decimal.Decimal('7.50'), final_date=today()).save()
+        self.account.make_transaction(self.member, 2, 'Gift')
+
+        data = self.client.get('/user/dashboard').json()
+
+        self.assertEqual(data['balances'], {'current': '5.50', 'final': '5.50'})
+        self.assertEqual(len(data['operations']), 2)
+        self.assertEqual(data['operations'][0]['counterparty'], 'user2')
+        self.assertEqual(data['operations'][0]['direction'], 'out')
+        self.assertEqual(sum(data['charts']['labels']['income']), 7.5)
+
+    def test_conditional_get(self):
+        response = self.client.get('/user/dashboard')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user/dashboard', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Session, user and account context only
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 3)
+        self.assertEqual(response.content, b'')
+
+        Operation(account=self.account, amount=1).save()
+        response = self.client.get('/user/dashboard', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        self.account.make_transaction(self.member, 1)
+        self.assertEqual(self.client.get('/user/dashboard', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+    def test_member_rename(self):
+        self.account.make_transaction(self.member, 1, 'Gift')
+        response = self.client.get('/user/dashboard')
+
+        self.member.rename('Member')
+        response = self.client.get('/user/dashboard', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['operations'][0]['counterparty'], 'Member (user2)')
+
+class FragmentCacheTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        cache.reset_stats()
+        self.client.force_login(self.user)
+
+    def _account(self):
+        return Account.objects.select_related('home').get(id=self.account.id)
+
+    def _fragment(self, name: str = 'test'):
+        return cache.get_fragment(name, self._account(), lambda: Operation.objects.count())
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self._fragment(), 0)
+        self.assertEqual(self._fragment(), 0)
+
+        self.assertEqual(cache.stats()['test'], {'hits': 1, 'misses': 1})
+
+    def test_signal_invalidation(self):
+        self._fragment()
+
+        op = Operation(account=self.account, amount=5)
+        op.save()
+        self.assertEqual(self._fragment(), 1)
+
+        Operation.objects.filter(id=op.id).update(description='Changed')
+        cache.on_account_change(Operation, op)
+        self._fragment()
+        self.assertEqual(cache.stats()['test']['misses'], 3)
+
+        label = self.home.add_label(Label(name='Test'))
+        self._fragment()
+        self.assertEqual(cache.stats()['test']['misses'], 4)
+        label.delete()
+        self._fragment()
+        self.assertEqual(cache.stats()['test']['misses'], 5)
+
+    def test_bulk_update_invalidation(self):
+        Operation(account=self.account, amount=5).save()
+        self._fragment()
+        self.account.finalize_operations()
+        self._fragment()
+
+        self.assertEqual(cache.stats()['test'], {'hits': 0, 'misses': 2})
+
+    def test_user_page(self):
+        self.client.get('/user')
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get('/user')
+        self.assertEqual(cache.stats()['recent_operations'], {'hits': 1, 'misses': 1})
+        self.assertEqual(cache.stats()['chart_data'], {'hits': 1, 'misses': 1})
+
+        Operation(account=self.account, amount=5, description='Fresh').save()
+        with CaptureQueriesContext(connection) as fresh:
+            response = self.client.get('/user')
+
+        self.assertIn('Fresh', response.content.decode())
+        self.assertLess(len(cached), len(fresh))
+
+    def test_pages(self):
+        for url in ('/user/planned', '/user/labels'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.assertEqual(cache.stats()['plans'], {'hits': 1, 'misses': 1})
+        self.assertEqual(cache.stats()['home_labels'], {'hits': 1, 'misses': 1})
+
+
+class BenchmarkTest(TestCase):
+
+    def _seed(self, seed=0):
+        seeder = benchmarks.Seeder(2, 3, 20, 2, seed=seed, end=today())
+        return seeder, seeder.run()
+
+    def _snapshot(self):
+        return list(Operation.objects.order_by('id').values_list(
+            'account__user__username', 'amount', 'label__name', 'creation_date', 'final_date'))
+
+    def test_seed(self):
+        seeder, counts = self._seed()
+        self.assertEqual(counts, {'homes': 2, 'accounts': 6, 'operations': 120, 'plans': 12})
+        self.assertTrue(seeder.exists())
+
+        for account in Account.objects.filter(user__username__startswith='seed0-'):
+            self.assertTrue(account.is_admin() == account.user.username.endswith('-0'))
+            ops = account.get_operations()
+            self.assertEqual(account.final_amount, sum(op.amount for op in ops))
+            self.assertEqual(account.current_amount, sum(op.amount for op in ops if op.final_date))
+        self.assertEqual(MonthlySummary.verify(), [])
+
+    def test_seed_keeps_other_summaries(self):
+        user = User(username='user1', password='asdfzxcv1234')
+        user.save()
+        account = Home.create_home(home_name='home1', user=user, currency=Home.Currency.USD).admin
+        Operation(account=account, amount=-5, final_date=today()).save()
+        summary = MonthlySummary.objects.get(account=account)
+
+        self._seed()
+
+        # A global rebuild would have recreated the summary
+        self.assertTrue(MonthlySummary.objects.filter(id=summary.id).exists())
+        self.assertEqual(MonthlySummary.verify(), [])
+
+    def test_deterministic(self):
+        seeder, _ = self._seed()
+        first = self._snapshot()
+        seeder.clear()
+        self.assertFalse(seeder.exists())
+
+        self._seed()
+        self.assertEqual(self._snapshot(), first)
+
+        self._seed(seed=1)
+        self.assertEqual(Home.objects.filter(name__startswith='seed').count(), 4)
+
+    def test_seed_command(self):
+        call_command('seedbudget', homes=1, accounts=2, operations=5, plans=1, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seedbudget', homes=1, accounts=2, operations=5, plans=1, stdout=StringIO())
+
+        call_command('seedbudget', homes=1, accounts=2, operations=7, plans=1, clear=True, stdout=StringIO())
+        self.assertEqual(Operation.objects.count(), 14)
+
+    def test_bench_command(self):
+        self._seed()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command('benchbudget', iterations=2, warmup=0, output=path, stderr=StringIO())
+            with open(path) as file:
+                data = json.load(file)
+
+            self.assertEqual(data['meta']['username'], 'seed0-0-0')
+            self.assertEqual(set(data['results']), set(benchmarks.Benchmark(
+                benchmarks.find_account()).scenarios()))
+            for result in data['results'].values():
+                self.assertGreater(result['p50_ms'], 0)
+            self.assertGreater(data['results']['user_view']['queries'], 0)
+
+            # The rolled back scenarios leave no trace
+            self.assertEqual(Operation.objects.count(), 120)
+
+            call_command('benchbudget', iterations=2, warmup=0, scenario=['user_view'], baseline=path,
+                         threshold=1000, fail_on_regression=True, stdout=StringIO(), stderr=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('benchbudget', scenario=['unknown'], stdout=StringIO())
+
+    def test_compare(self):
+        baseline = {'view': {'p50_ms': 10, 'queries': 5}}
+
+        self.assertEqual(benchmarks.compare({'view': {'p50_ms': 11, 'queries': 5}}, baseline, 1.2), [])
+        self.assertEqual(len(benchmarks.compare({'view': {'p50_ms': 13, 'queries': 6}}, baseline, 1.2)), 2)
+        self.assertEqual(benchmarks.compare({'other': {'p50_ms': 99, 'queries': 9}}, baseline, 1.2), [])
+
+
+class QueryBudgetTest(TestCase):
+    """Every view must make a fixed number of queries, independent of the number of operations.
+    The requests are measured with cold caches, so the budgets are the worst case.
+    """
+
+    SIZES = (40, 400)
+    """Operations per account of the two seeded Homes."""
+
+    BUDGETS = {
+        'index': 4,
+        'new_home': 4,
+        'user': 13,
+        'user_dashboard': 7,
+        'user_history': 5,
+        'user_history_page': 4,
+        'operation_detail': 4,
+        'user_export': 4,
+        'user_labels': 7,
+        'planned_operations': 5,
+        'user_home': 9,
+        'own_account': 5,
+        'manage_user': 10,
+
+        'user_add_operation': 6,
+        'user_fin_operation': 9,
+        'user_rm_operation': 9,
+        'user_transaction': 12,
+        'user_refresh': 6,
+        'history_add_operation': 6,
+        'history_fin_all': 9,
+        'history_fin_selected': 9,
+        'labels_add': 7,
+        'labels_rm': 12,
+        'labels_add_home': 9,
+        'labels_rm_home': 14,
+        'plans_add': 11,
+        'plans_rm': 9,
+        'home_transaction': 14,
+        'home_split': 14,
+        'home_create_user': 12,
+        'api_transfers': 14,
+        'view_as': 8,
+        'own_account_rename': 4,
+        'manage_user_perms': 12,
+        'metrics': 4,
+    }
+    """Maximum number of queries (without savepoints) of every request."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for seed, size in enumerate(cls.SIZES, 1):
+            benchmarks.Seeder(1, 3, size, 3, seed=seed).run()
+            admin = Account.objects.get(user__username=f'seed{seed}-0-0')
+            admin.add_label(Label(name='Personal'))
+            # Staff can read the metrics
+            User.objects.filter(id=admin.user_id).update(is_staff=True)
+
+    def _requests(self, seed: int):
+        """Returns the measured requests by name as `(method, path, data, status)`."""
+
+        admin = Account.objects.get(user__username=f'seed{seed}-0-0')
+        member = Account.objects.get(user__username=f'seed{seed}-0-1')
+        ops = admin.get_operations().order_by('-creation_date', '-id')
+        op = ops.filter(final_date__isnull=True).first()
+        _, cursor = admin.get_operations_page(size=OpHistoryView.page_size)
+        label = Label.objects.get(account=admin)
+        home_label = admin.home.get_labels(home_only=True).first()
+        plan = admin.get_plans().first()
+
+        operation = {'add_operation': '', 'amount': '5.00', 'description': 'New', 'label': '', 'finalized': 'on'}
+        transfer = {'direction': 'send', 'legs': [{'account': member.id, 'amount': '1.00'}]}
+
+        return {
+            'index': ('get', '/', None, 200),
+            'new_home': ('get', '/new/', None, 200),
+            'user': ('get', '/user', None, 200),
+            'user_dashboard': ('get', '/user/dashboard', None, 200),
+            'user_history': ('get', '/user/history', None, 200),
+            'user_history_page': ('get', '/user/history/page', {'cursor': cursor}, 200),
+            'operation_detail': ('get', f'/user/history/{op.id}', None, 200),
+            'user_export': ('get', '/user/export', {'format': 'csv'}, 200),
+            'user_labels': ('get', '/user/labels', None, 200),
+            'planned_operations': ('get', '/user/planned', None, 200),
+            'user_home': ('get', '/home', None, 200),
+            'own_account': ('get', f'/home/{admin.user.username}', None, 200),
+            'manage_user': ('get', f'/home/{member.user.username}', None, 200),
+
+            'user_add_operation': ('post', '/user', operation, 302),
+            'user_fin_operation': ('post', '/user', {'fin_id': op.id}, 302),
+            'user_rm_operation': ('post', '/user', {'rm_id': op.id}, 302),
+            'user_transaction': ('post', '/user', {'transaction': '', 'amount': '1.00', 'destination': member.id}, 302),
+            'user_refresh': ('post', '/user', {'refresh': ''}, 302),
+            'history_add_operation': ('post', '/user/history', operation, 302),
+            'history_fin_all': ('post', '/user/history', {'fin_all': ''}, 302),
+            'history_fin_selected': ('post', '/user/history', {
+                'fin_selected': '', 'fin_ids': [op.id for op in ops.filter(final_date__isnull=True)[:3]]}, 302),
+            'labels_add': ('post', '/user/labels', {'add_pers_label': '', 'name': 'Added'}, 302),
+            'labels_rm': ('post', '/user/labels', {'pers_rm_id': label.id}, 302),
+            'labels_add_home': ('post', '/user/labels', {'add_home_label': '', 'name': 'Added'}, 302),
+            'labels_rm_home': ('post', '/user/labels', {'home_rm_id': home_label.id}, 302),
+            'plans_add': ('post', '/user/planned', {
+                'add_cyclic_op': '', 'amount': '5.00', 'period': OperationPlan.TimePeriod.MONTH,
+                'period_count': 1, 'label': '', 'description': ''}, 302),
+            'plans_rm': ('post', '/user/planned', {'rm_id': plan.id}, 302),
+            'home_transaction': ('post', '/home', {'transaction': member.id, 'amount': '1.00'}, 302),
+            'home_split': ('post', '/home', {
+                'split': '', 'direction': 'collect', 'amount': '9.00', 'members': [member.id],
+                'include_self': 'on'}, 302),
+            'home_create_user': ('post', '/home', {
+                'create': '', 'username': 'created', 'password1': 'qwerty!2345A', 'password2': 'qwerty!2345A'}, 302),
+            'api_transfers': ('json', '/api/transfers', transfer, 201),
+            'view_as': ('post', '/view_as', {'begin': member.user.username}, 302),
+            'own_account_rename': ('post', f'/home/{admin.user.username}', {'rename': '', 'first_name': 'Renamed'}, 302),
+            'manage_user_perms': ('post', f'/home/{member.user.username}', {
+                'change': '', 'choices': ['make_transactions']}, 302),
+            'metrics': ('get', '/metrics', None, 200),
+        }
+
+    def _count(self, method: str, path: str, data, status: int):
+        """Makes the request with cold caches in a rolled back transaction and returns the number of queries."""
+
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            if method == 'json':
+                response = self.client.post(path, json.dumps(data), content_type='application/json')
+            else:
+                response = getattr(self.client, method)(path, data)
+            if isinstance(response, StreamingHttpResponse):
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+
+        self.assertEqual(response.status_code, status, path)
+        return len([query for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))])
+
+    def _measure(self, seed: int):
+        self.client.force_login(User.objects.get(username=f'seed{seed}-0-0'))
+        return {name: self._count(*request) for name, request in self._requests(seed).items()}
+
+    def test_budgets(self):
+        small, large = (self._measure(seed) for seed in range(1, len(self.SIZES) + 1))
+
+        self.assertEqual(set(small), set(self.BUDGETS))
+        self.assertEqual({resolve(request[1]).url_name for request in self._requests(1).values()},
+                         {pattern.name for pattern in urls.urlpatterns})
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name):
+                self.assertLessEqual(small[name], budget)
+                self.assertEqual(large[name], small[name])
+
+
+class RequestTimingTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+    def _client(self):
+        client = Client()
+        client.force_login(self.user)
+        return client
+
+    def test_disabled(self):
+        response = self._client().get('/user')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(BUDGET_TIMING=True)
+    def test_get(self):
+        with self.assertLogs('budget.timing', 'INFO') as logs:
+            response = self._client().get('/user')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(len(logs.records), 1)
+
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertLogs('budget.timing', 'INFO') as logs:
+            response = self._client().get('/user')
+
+        header = response['Server-Timing']
+        for metric in ('db;', 'tpl;', 'view;', 'total;'):
+            self.assertIn(metric, header)
+        self.assertNotIn('tpl;dur=0.00', header)
+
+        self.assertEqual(len(logs.records), 1)
+        data = logs.records[0].timings
+        self.assertEqual(data['view'], 'UserView:get')
+        self.assertGreater(data['queries'], 0)
+        self.assertGreater(data['template_ms'], 0)
+        self.assertLessEqual(data['view_ms'], data['total_ms'])
+        self.assertIn(f'queries={data["queries"]}', logs.output[0])
+
+    @override_settings(BUDGET_TIMING=True, BUDGET_SLOW_QUERY_MS=0)
+    def test_post_action_and_slow_queries(self):
+        with self.assertLogs('budget.timing', 'INFO') as logs:
+            response = self._client().post('/user', {
+                'add_operation': '', 'amount': '5.00', 'description': 'New', 'label': ''})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(logs.records[0].timings['view'], 'UserView:add_operation')
+
+        slow = [record.getMessage() for record in logs.records if record.levelname == 'WARNING']
+        self.assertEqual(len(slow), timing.MAX_SLOW_QUERIES)
+        self.assertTrue(any('plan:\n-' not in message for message in slow))
+
+    @override_settings(BUDGET_TIMING=True)
+    def test_dispatched_action(self):
+        member = User(username='user2', password='asdfzxcv1234')
+        member.save()
+        member = Account(user=member, home=self.home)
+        member.save()
+
+        # The form also carries keys of other actions, the view dispatches on `change`
+        with self.assertLogs('budget.timing', 'INFO') as logs:
+            self._client().post(f'/home/{member.user.username}', {'change': '', 'remove': '', 'rename': ''})
+        self.assertEqual(logs.records[0].timings['view'], 'AccountView:change')
+
+    def test_view_name(self):
+        request = RequestFactory().post('/home', {'amount': '1', 'split': ''})
+        self.assertEqual(timing.get_view_name(request, views.HomeView.as_view()), 'HomeView:post')
+        timing.record_action(request, 'split')
+        self.assertEqual(timing.get_view_name(request, views.HomeView.as_view()), 'HomeView:split')
+
+        request = RequestFactory().get('/')
+        self.assertEqual(timing.get_view_name(request, views.index), 'index:get')
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234')
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+        self.account = self.home.admin
+
+        metrics.metrics.clear()
+        cache.reset_stats()
+        self.client.force_login(self.user)
+
+    def _metrics(self):
+        with override_settings(BUDGET_METRICS_TOKEN='secret'):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_format(self):
+        counter = metrics.Counter('test_total', 'Test counter.', ['name'])
+        counter.inc(name='a "quoted"\nname')
+        histogram = metrics.Histogram('test_seconds', 'Test histogram.', buckets=(1, 2))
+        for value in (0.5, 1.5, 3):
+            histogram.observe(value)
+
+        self.assertEqual(counter.render(), [
+            '# HELP test_total Test counter.', '# TYPE test_total counter',
+            'test_total{name="a \\"quoted\\"\\nname"} 1'])
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{le="1"} 1', 'test_seconds_bucket{le="2"} 2', 'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_sum 5.0', 'test_seconds_count 3'])
+
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+    def test_requests(self):
+        self.client.get('/user')
+        self.client.get('/user')
+        self.client.post('/user', {'refresh': ''})
+
+        text = self._metrics()
+        self.assertIn('budget_request_duration_seconds_count{view="UserView:get"} 2', text)
+        self.assertIn('budget_request_queries_bucket{view="UserView:refresh",le="+Inf"} 1', text)
+        self.assertIn('budget_requests_total{view="UserView:refresh",status="302"} 1', text)
+        self.assertIn('budget_balance_recalculations_total 1', text)
+        self.assertIn('budget_fragment_cache_hit_ratio{fragment="chart_data"} 0.5', text)
+
+    def test_plan_runs(self):
+        OperationPlan(account=self.account, amount=5, period=OperationPlan.TimePeriod.DAY, period_count=1,
+                      next_date=today() - timezone.timedelta(days=2)).save()
+
+        call_command('planoperations', stdout=StringIO())
+        call_command('planoperations', stdout=StringIO())
+
+        self.assertEqual(PlanRun.objects.count(), 2)
+
+        text = self._metrics()
+        self.assertIn('budget_planoperations_runs_total 2', text)
+        self.assertIn('budget_planoperations_operations_total 3', text)
+        self.assertIn('budget_planoperations_last_operations 0', text)
+
+    def test_access(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+        with override_settings(BUDGET_METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        self.user = User(username='user1', password='asdfzxcv1234', is_staff=True)
+        self.user.save()
+        self.home = Home.create_home(
+            home_name='home1', user=self.user, currency=Home.Currency.USD)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(BUDGET_PROFILE_DIR=self.directory.name, BUDGET_PROFILE_INTERVAL=0.001)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client.force_login(self.user)
+
+    def _read(self, name: str):
+        with open(os.path.join(self.directory.name, name)) as file:
+            return file.read()
+
+    def test_sampler(self):
+        with profiling.Sampler() as sampler:
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        self.assertGreater(sampler.samples, 0)
+        self.assertEqual(sum(sampler.stacks.values()), sampler.samples)
+        self.assertIn('budget.tests:ProfilingTest.test_sampler', sampler.collapsed())
+
+        with profiling.Sampler(max_samples=3) as sampler:
+            time.sleep(0.05)
+        self.assertEqual(sampler.samples, 3)
+
+    def test_single_sampler(self):
+        with profiling.Sampler():
+            self.assertFalse(profiling.Sampler().start())
+
+        sampler = profiling.Sampler()
+        self.assertTrue(sampler.start())
+        sampler.stop()
+
+    def test_request(self):
+        self.assertNotIn('X-Budget-Profile', self.client.get('/user'))
+
+        response = self.client.get('/user', {'profile': ''})
+        name = response['X-Budget-Profile']
+        self.assertTrue(name.startswith('get-user-') and name.endswith('.collapsed'))
+        for line in self._read(name).splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack and int(count) > 0)
+
+        response = self.client.get('/user', HTTP_X_BUDGET_PROFILE='1')
+        self.assertIn('X-Budget-Profile', response)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertNotIn('X-Budget-Profile', self.client.get('/user', {'profile': ''}))
+
+    def test_command(self):
+        stderr = StringIO()
+        call_command('planoperations', profile=True, stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('written to', stderr.getvalue())
+        self.assertEqual(len([name for name in os.listdir(self.directory.name)
+                              if name.startswith('planoperations-')]), 1)
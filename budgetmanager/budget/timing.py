@@ -0,0 +1,181 @@
+import logging
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import DatabaseError, connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('budget.timing')
+
+MAX_SLOW_QUERIES = 3
+"""Maximum number of slow queries of a request logged with their plans."""
+
+_current: ContextVar['RequestTimings | None'] = ContextVar('budget_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent in the SQL queries, templates and view of a single request, in milliseconds."""
+
+    def __init__(self, slow_query_ms: float):
+        self.slow_query_ms = slow_query_ms
+        self.start = perf_counter()
+
+        self.name = None
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.view = 0.0
+        self.total = 0.0
+        self.slow_queries = []
+
+        self._view = None
+        self._view_start = None
+        self._template_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        """Database execute wrapper (see `connection.execute_wrapper()`) timing every query."""
+
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (perf_counter() - start) * 1000
+            self.queries += 1
+            self.db += duration
+            if duration >= self.slow_query_ms:
+                self.slow_queries.append((duration, sql, None if many else params, context['connection'].alias))
+
+    def start_view(self, request, view_func):
+        self._view = (request, view_func)
+        self._view_start = perf_counter()
+
+    def finish(self):
+        end = perf_counter()
+        if self._view_start is not None:
+            self.view = (end - self._view_start) * 1000
+            # Named after the view has run as it records the action it dispatched to
+            self.name = get_view_name(*self._view)
+        self.total = (end - self.start) * 1000
+
+    def get_slowest_queries(self):
+        """Returns the slowest queries above the threshold as `(duration, sql, params, alias)` tuples."""
+
+        return sorted(self.slow_queries, key=lambda query: query[0], reverse=True)[:MAX_SLOW_QUERIES]
+
+    def as_dict(self):
+        return {
+            'view': self.name,
+            'total_ms': round(self.total, 2),
+            'view_ms': round(self.view, 2),
+            'db_ms': round(self.db, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template, 2),
+        }
+
+    def server_timing(self):
+        """Returns the value of the `Server-Timing` header."""
+
+        return ', '.join([
+            f'db;dur={self.db:.2f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template:.2f}',
+            f'view;dur={self.view:.2f}',
+            f'total;dur={self.total:.2f}',
+        ])
+
+
+def get_current() -> RequestTimings | None:
+    """Returns the timings of the request being handled, if they are recorded."""
+
+    return _current.get()
+
+
+def activate(timings: RequestTimings | None):
+    """Makes the timings current. Returns a token for `deactivate()`."""
+
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record_action(request, action: str):
+    """Records the action a view dispatched the request to, e.g. the POST key of the submitted form.
+    The action names the request in the timings and metrics.
+    """
+
+    request.budget_action = action
+
+
+def get_view_name(request, view_func) -> str:
+    """Returns the name of the view class or function followed by the recorded action (see `record_action()`)
+    or the request method, e.g. `UserView:add_operation` or `HomeView:get`.
+    """
+
+    view = getattr(view_func, 'view_class', view_func)
+    action = getattr(request, 'budget_action', None) or request.method.lower()
+
+    return f'{view.__name__}:{action}'
+
+
+def explain(sql: str, params, alias: str) -> str | None:
+    """Returns the plan of a SELECT query or None if it cannot be explained."""
+
+    if params is None or not sql.lstrip().upper().startswith('SELECT'):
+        return None
+
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError:
+        return None
+
+
+def log(request, response, timings: RequestTimings):
+    """Logs the request timings as a single key=value line and the slowest queries with their plans."""
+
+    data = timings.as_dict()
+    logger.info(' '.join([f'method={request.method}', f'path={request.path}', f'status={response.status_code}',
+                          *(f'{key}={value}' for key, value in data.items())]),
+                extra={'timings': data})
+
+    for duration, sql, params, alias in timings.get_slowest_queries():
+        logger.warning('slow query view=%s duration_ms=%.2f sql=%s\nplan:\n%s',
+                       timings.name, duration, sql, explain(sql, params, alias) or '-')
+
+
+class TimedTemplate:
+    """Template wrapper adding the render time to the current request timings."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = get_current()
+        if timings is None:
+            return self.template.render(context, request)
+
+        # Templates rendered by other templates (e.g. form layouts) are already counted
+        timings._template_depth += 1
+        start = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings._template_depth -= 1
+            if not timings._template_depth:
+                timings.template += (perf_counter() - start) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend which reports the render time to the request timings (see `RequestTimingMiddleware`)."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
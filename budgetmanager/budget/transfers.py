@@ -0,0 +1,155 @@
+import decimal
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+from . import metrics
+from .models import Account, Label, MonthlySummary, Operation
+from .utils import today
+
+MAX_LEGS = 100
+"""Maximum number of legs of a single split transfer."""
+
+
+class TransferError(ValueError):
+    """Raised when a transfer is invalid, e.g. the amount is not positive."""
+
+
+def transfer(source: Account, destination: Account, amount, description: str = None):
+    """Transfers the amount from the source to the destination account.
+
+    Both accounts are locked, both legs are inserted and both balances are updated in a single transaction.
+    Returns a tuple of `(outcoming, incoming)` operations.
+    """
+
+    return _execute([(source, destination, amount)], description)[0]
+
+
+def split(payer: Account, recipients: list[tuple[Account, object]], description: str = None):
+    """Transfers the amounts from the payer to each of the `(recipient, amount)` pairs (1 to N) atomically.
+    Returns the list of `(outcoming, incoming)` operation pairs.
+    """
+
+    return _execute([(payer, recipient, amount) for recipient, amount in recipients], description)
+
+
+def collect(recipient: Account, payers: list[tuple[Account, object]], description: str = None):
+    """Transfers the amounts from each of the `(payer, amount)` pairs to the recipient (N to 1) atomically.
+    Returns the list of `(outcoming, incoming)` operation pairs.
+    """
+
+    return _execute([(payer, recipient, amount) for payer, amount in payers], description)
+
+
+def split_evenly(total, parts: int) -> list[decimal.Decimal]:
+    """Splits the total into `parts` amounts differing by at most one cent.
+    The remaining cents go to the first parts.
+    """
+
+    cents = int(_to_amount(total) * 100)
+    share, remainder = divmod(cents, parts)
+
+    return [decimal.Decimal(share + (1 if i < remainder else 0)) / 100 for i in range(parts)]
+
+
+def _execute(legs: list[tuple[Account, Account, object]], description: str | None):
+    """Executes the transfers described by `(source, destination, amount)` tuples atomically.
+    Returns the list of `(outcoming, incoming)` operation pairs in the order of `legs`.
+    """
+
+    if not legs:
+        raise TransferError('A transfer needs at least one leg.')
+    if len(legs) > MAX_LEGS:
+        raise TransferError(f'A transfer can have at most {MAX_LEGS} legs.')
+
+    legs = [(source, destination, _to_amount(amount)) for source, destination, amount in legs]
+    for source, destination, _ in legs:
+        if source.id == destination.id:
+            raise TransferError('Cannot transfer money to the same account.')
+        if source.home_id != destination.home_id:
+            raise TransferError('Cannot transfer money to an account in another Home.')
+
+    deltas = defaultdict(decimal.Decimal)
+    for source, destination, amount in legs:
+        deltas[source.id] -= amount
+        deltas[destination.id] += amount
+
+    label_id = Label.get_global_id('Internal')
+    day = today()
+
+    with transaction.atomic():
+        # Locking in primary key order prevents deadlocks between opposite transfers
+        list(Account.objects.select_for_update().filter(id__in=list(deltas)).order_by('id').values_list('id'))
+
+        outcoming = Operation.objects.bulk_create([
+            Operation(account=source, amount=-amount, description=description,
+                      final_date=day, label_id=label_id)
+            for source, _, amount in legs])
+        incoming = Operation.objects.bulk_create([
+            Operation(account=destination, amount=amount, description=description,
+                      final_date=day, label_id=label_id, source=out)
+            for (_, destination, amount), out in zip(legs, outcoming)])
+
+        _apply_deltas(deltas)
+
+        for account_id in deltas:
+            income, expenses = _split_delta(legs, account_id)
+            MonthlySummary.record(account_id, label_id, day, income=income, expenses=expenses)
+
+    for source, destination, amount in legs:
+        _update_in_memory(source, -amount)
+        _update_in_memory(destination, amount)
+
+    return list(zip(outcoming, incoming))
+
+
+def _to_amount(amount) -> decimal.Decimal:
+    """Converts the amount to a Decimal and checks if it is positive and at most `Account.MAX_AMOUNT`."""
+
+    try:
+        amount = decimal.Decimal(str(amount))
+    except decimal.InvalidOperation:
+        raise TransferError('Invalid amount.')
+
+    if not amount.is_finite() or amount <= 0:
+        raise TransferError('The amount must be positive.')
+
+    try:
+        amount = amount.quantize(decimal.Decimal('0.01'))
+    except decimal.InvalidOperation:
+        raise TransferError('Invalid amount.')
+
+    if amount > Account.MAX_AMOUNT:
+        raise TransferError(f'The amount cannot exceed {Account.MAX_AMOUNT}.')
+
+    return amount
+
+
+def _apply_deltas(deltas: dict[int, decimal.Decimal]):
+    """Adds the deltas to both amounts of the accounts and bumps their versions with a single UPDATE."""
+
+    delta = Case(*[When(id=account_id, then=Value(value)) for account_id, value in deltas.items()],
+                 output_field=Account._meta.get_field('final_amount'))
+
+    metrics.BALANCE_UPDATES.inc(len(deltas))
+    Account.objects.filter(id__in=list(deltas)).update(
+        final_amount=Account._clamped(F('final_amount') + delta),
+        current_amount=Account._clamped(F('current_amount') + delta),
+        version=F('version') + 1)
+
+
+def _split_delta(legs, account_id: int):
+    """Returns the total `(income, expenses)` of the account in the legs."""
+
+    income = sum((amount for _, destination, amount in legs if destination.id == account_id), decimal.Decimal(0))
+    expenses = sum((amount for source, _, amount in legs if source.id == account_id), decimal.Decimal(0))
+
+    return income, expenses
+
+
+def _update_in_memory(account: Account, amount: decimal.Decimal):
+    """Updates the in-memory amounts of the account instance like `Account.apply_amounts()`."""
+
+    account.final_amount = account._clamp(decimal.Decimal(str(account.final_amount)) + amount)
+    account.current_amount = account._clamp(decimal.Decimal(str(account.current_amount)) + amount)
@@ -4,13 +4,19 @@ from . import views
 urlpatterns = [
     path('',  views.index, name='index'),
     path('user', views.UserView.as_view(), name='user_page'),
+    path('user/dashboard', views.DashboardDataView.as_view(), name='user_dashboard'),
     path('user/history', views.OpHistoryView.as_view(), name='user_history'),
+    path('user/history/page', views.OpHistoryPageView.as_view(), name='user_history_page'),
+    path('user/history/<int:op_id>', views.OpDetailView.as_view(), name='operation_detail'),
+    path('user/export', views.ExportView.as_view(), name='user_export'),
     path('user/labels', views.UserLabelsView.as_view(), name='user_labels'),
     path('user/planned', views.CyclicOperationsView.as_view(), name='planned_operations'),
     
     path('home', views.HomeView.as_view(), name='user_home'),
     path('home/<str:username>', views.AccountView.as_view(), name='manage_user'),
     path('view_as', views.ViewAsView.as_view(), name='view_as'),
+    path('api/transfers', views.TransferApiView.as_view(), name='api_transfers'),
 
     path('new/', views.AddHomeView.as_view(), name='new_home'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
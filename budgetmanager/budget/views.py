@@ -1,25 +1,47 @@
 from abc import ABC
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.http.request import HttpRequest
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.decorators import method_decorator
-from django.contrib.auth.decorators import login_required, permission_required
+from django.views.decorators.http import condition
+from django.contrib.auth.decorators import login_required
 from django.views.generic.base import TemplateView, View
 from django.contrib.auth.forms import UserCreationForm
+import csv
+import hmac
+import io
 import json
 
 from .models import *
-from . import forms
-from .decorators import home_required
+from . import cache, dashboard, exports, forms, imports, metrics, timing, transfers
+from .decorators import account_perm_required, home_required
+from .middleware import get_account_context, reset_account_context
 
 
 def index(request: HttpRequest):
     return render(request, 'budget/index.html')
 
 
+def metrics_view(request: HttpRequest):
+    """Exposes the metrics in the Prometheus text format to staff users and to scrapers sending
+    the `BUDGET_METRICS_TOKEN` setting as a bearer token.
+    """
+
+    token = getattr(settings, 'BUDGET_METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    return HttpResponse(metrics.metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @method_decorator(
     (login_required(), home_required(),
-     permission_required('budget.plan_for_others')),
+     account_perm_required('budget.plan_for_others')),
     name='dispatch')
 class ViewAsView(View):
     """View for managin operations as another user. It serves mostly as a session-changing redirect."""
@@ -28,8 +50,10 @@ class ViewAsView(View):
 
         post = request.POST
         if post.get('begin') is not None:
+            timing.record_action(request, 'begin')
             return self._begin()
         elif post.get('end') is not None:
+            timing.record_action(request, 'end')
             return self._end()
 
         return redirect('/')
@@ -42,7 +66,9 @@ class ViewAsView(View):
 
         try:
             view_account = User.objects.filter(username=username).get().account
-            if not request.user.has_perm('budget.plan_for_others') or request.user.account.home != view_account.home:
+            actual_account = get_account_context(request).actual_account
+            if not actual_account.has_perm('budget.plan_for_others') or \
+                    actual_account.home_id != view_account.home_id:
                 messages.error(request, 'Cannot perform view as.')
 
             request.session['view_as'] = view_account.user.username
@@ -79,6 +105,16 @@ class BaseTemplateView(TemplateView):
 
         return render(self.request, self.template_name, self.get_context_data())
 
+    def _posted(self, key: str, allow_empty: bool = True) -> bool:
+        """Checks if the POST data selects the `key` action. If so, the key is recorded as the request's action."""
+
+        value = self.request.POST.get(key)
+        if value is None or (not value and not allow_empty):
+            return False
+
+        timing.record_action(self.request, key)
+        return True
+
     def update_context(self, context: dict = None, **kwargs):
         """Method adding passed keyword arguments to the view's extra_context."""
 
@@ -130,13 +166,9 @@ class BaseUserView(ABC, BaseTemplateView):
 
     def setup(self, request: HttpRequest, *args, **kwargs):
 
-        view_as = request.session.get('view_as')
-        if view_as:
-            self.user = User.objects.filter(username=view_as).get()
-            self.actual_user = request.user
-        else:
-            self.user = request.user
-            self.actual_user = None
+        self.account_context = get_account_context(request)
+        self.user = self.account_context.user
+        self.actual_user = request.user if self.account_context.is_view_as else None
 
         super().setup(request, *args, **kwargs)
 
@@ -217,7 +249,7 @@ class UserView(BaseUserView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context['operations'] = self.user.account.get_operations()[:5]
+        context['operations'] = dashboard.get_recent_operations(self.user.account)
         context['final_amount'] = self.user.account.final_amount
         context['current_amount'] = self.user.account.current_amount
 
@@ -229,7 +261,7 @@ class UserView(BaseUserView):
             'transaction_form') or forms.TransDestinationForm.from_account(self.user.account)
         context['transaction_form'] = trans_form
 
-        context['make_transactions'] = self.user.has_perm(
+        context['make_transactions'] = self.user.account.has_perm(
             'budget.make_transactions')
 
         self._update_chart_data(context)
@@ -239,57 +271,55 @@ class UserView(BaseUserView):
     def _update_chart_data(self, context: dict):
         """Updates the chart data for the user."""
 
-        context['allOperations'] = self.user.account.get_operations().order_by('-id')
-
-        income_string = [str(el)
-                         for el in self.user.account.get_this_year_income()]
-        context['income'] = ','.join(income_string)
-
-        expenses_string = [str(el)
-                           for el in self.user.account.get_this_year_expenses()]
-        context['expenses'] = ','.join(expenses_string)
-
-        context['operation_data'] = self._get_operations_json()
-
-    def _get_operations_json(self):
-        """Creates a JSON of this month\'s operations."""
-
-        operations = self.user.account.get_this_month_operations()
-        op_list = []
-
-        for op in operations:
-            op_list.append(json.dumps({
-                'amount': str(op.amount),
-                'label': [str(op.label.id), str(op.label)] if op.label else ['0', 'No label'],
-            }))
-
-        return json.dumps(op_list)
+        account = self.user.account
+        context['chart_data'] = cache.get_fragment('chart_data', account, lambda: dashboard.get_chart_data(account))
 
     def post(self, request: HttpRequest, *args, **kwargs):
         """Modifies the user page and renders it."""
 
         post = request.POST
 
-        if post.get('rm_id') is not None:  # Remove an operation
+        if self._posted('rm_id'):  # Remove an operation
             op_id = post.get('rm_id')
             return self._rm_op(op_id)
 
-        elif post.get('fin_id') is not None:  # Finalize an operation
+        elif self._posted('fin_id'):  # Finalize an operation
             op_id = post.get('fin_id')
             return self._fin_op(op_id)
 
-        elif post.get('add_operation') is not None:  # Add a new operation
+        elif self._posted('add_operation'):  # Add a new operation
             return self._add_operation()
 
-        elif post.get('transaction') is not None:
+        elif self._posted('transaction'):
             return self._make_transaction()
 
-        elif post.get('refresh') is not None:
+        elif self._posted('refresh'):
             self.user.account.recalculate_amounts()
 
         return self.redirect()
 
 
+def _dashboard_etag(request: HttpRequest, *args, **kwargs):
+    account = get_account_context(request).account
+    return dashboard.get_etag(account) if account else None
+
+
+@method_decorator(
+    (login_required(), home_required(), condition(etag_func=_dashboard_etag)),
+    name='get')
+class DashboardDataView(View):
+    """JSON data of the user page (balances, recent operations and chart series).
+    Responds with `304 Not Modified` if the data has not changed since the client's ETag (see `dashboard.get_etag()`).
+    """
+
+    def get(self, request: HttpRequest, *args, **kwargs):
+        response = JsonResponse(dashboard.get_dashboard_data(get_account_context(request).account))
+
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+
 class OpHistoryView(BaseUserView):
     """Full operation history view class."""
 
@@ -297,35 +327,130 @@ class OpHistoryView(BaseUserView):
 
     redirect_name = 'user_history'
 
+    page_size = 25
+    """Number of operations rendered at once."""
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(kwargs=kwargs)
 
-        context['operations'] = self.user.account.get_operations()
+        operations, next_cursor = self.user.account.get_operations_page(size=self.page_size)
+        context['operations'] = operations
+        context['next_cursor'] = next_cursor
 
         add_op_form = context.get(
             'add_op_form') or forms.AddOperationForm.from_account(self.user.account)
         context['add_op_form'] = add_op_form
 
+        context['import_form'] = context.get('import_form') or forms.ImportOperationsForm()
+
         return context
 
     def post(self, request: HttpRequest, *args, **kwargs):
-        if request.POST.get('rm_id') is not None:
+        if self._posted('rm_id'):
             op_id = request.POST.get('rm_id')
             return self._rm_op(op_id)
 
-        elif request.POST.get('fin_id') is not None:
+        elif self._posted('fin_id'):
             op_id = request.POST.get('fin_id')
             return self._fin_op(op_id)
 
-        elif request.POST.get('fin_all') is not None:
-            self.user.account.finalize_operations()
+        elif self._posted('fin_all'):
+            count = self.user.account.finalize_operations()
+            messages.success(request, f'{count} operation(s) finalized.')
 
-        elif request.POST.get('add_operation') is not None:
+        elif self._posted('fin_selected'):
+            return self._fin_selected()
+
+        elif self._posted('import_ops'):
+            return self._import_ops()
+
+        elif self._posted('add_operation'):
             return self._add_operation()
 
         return self.redirect()
 
 
+    def _fin_selected(self):
+        """Finalizes the operations selected in the POST data if they belong to the user."""
+
+        ids = [op_id for op_id in self.request.POST.getlist('fin_ids') if op_id.isdigit()]
+        if not ids:
+            messages.error(self.request, 'No operations selected.')
+            return self.redirect()
+
+        count = self.user.account.finalize_operations(ids=ids)
+        messages.success(self.request, f'{count} operation(s) finalized.')
+        return self.redirect()
+
+    def _import_ops(self):
+        """Imports operations from the uploaded CSV file."""
+
+        form = forms.ImportOperationsForm(self.request.POST, self.request.FILES)
+        if not form.is_valid():
+            self.update_context(import_form=form)
+            messages.error(self.request, 'Invalid import form.')
+            return self.render()
+
+        lines = io.TextIOWrapper(form.cleaned_data.get('file'), encoding='utf-8-sig', newline='')
+        try:
+            result = imports.import_operations(self.user.account, lines)
+        except (UnicodeDecodeError, csv.Error):
+            messages.error(self.request, 'The file is not a valid CSV file.')
+            return self.redirect()
+
+        messages.success(self.request, str(result))
+        for line, error in result.errors:
+            messages.warning(self.request, f'Line {line}: {error}')
+
+        return self.redirect()
+
+
+class OpHistoryPageView(BaseUserView):
+    """View returning the next page of the operation history rows as an HTML fragment.
+    The cursor of the following page is sent in the `X-Next-Cursor` header.
+    """
+
+    template_name = 'budget/user/lists/history_rows.html'
+
+    def get(self, request: HttpRequest, *args, **kwargs):
+        operations, next_cursor = self.user.account.get_operations_page(
+            cursor=request.GET.get('cursor'), size=OpHistoryView.page_size)
+
+        response = render(request, self.template_name, {'operations': operations})
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+
+        return response
+
+
+class OpDetailView(BaseUserView):
+    """View returning the details of a single operation as an HTML fragment."""
+
+    template_name = 'budget/user/history_detail.html'
+
+    def get(self, request: HttpRequest, *args, **kwargs):
+        op = get_object_or_404(Operation.objects.for_list(), id=kwargs.get('op_id'), account=self.user.account)
+
+        return render(request, self.template_name, {'op': op})
+
+
+class ExportView(BaseUserView):
+    """View streaming the filtered operation history as a CSV or JSONL file."""
+
+    def get(self, request: HttpRequest, *args, **kwargs):
+        form = forms.ExportOperationsForm.from_get(self.user.account, request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest('Invalid export parameters.')
+
+        rows, content_type = exports.FORMATS[form.cleaned_data.get('format')]
+        response = StreamingHttpResponse(rows(form.get_operations(self.user.account)),
+                                         content_type=content_type)
+        filename = f'operations-{today().isoformat()}.{form.cleaned_data.get("format")}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        return response
+
+
 class UserLabelsView(BaseUserView):
     """View for showing and editing user-specific labels."""
 
@@ -336,15 +461,16 @@ class UserLabelsView(BaseUserView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context['pers_labels'] = self.user.account.available_labels(
-            include_home=False)
-        context['home_labels'] = self.user.account.home.get_labels(
-            home_only=True)
+        account = self.user.account
+        context['pers_labels'] = cache.get_fragment(
+            'personal_labels', account, lambda: list(account.available_labels(include_home=False)))
+        context['home_labels'] = cache.get_fragment(
+            'home_labels', account, lambda: list(account.home.get_labels(home_only=True)))
 
         add_label_form = context.get('add_label_form') or forms.AddLabelForm()
         context['add_label_form'] = add_label_form
 
-        context['manage_home_labels'] = self.user.has_perm(
+        context['manage_home_labels'] = self.user.account.has_perm(
             'budget.manage_home_labels')
 
         return context
@@ -353,27 +479,27 @@ class UserLabelsView(BaseUserView):
 
         post = request.POST
 
-        if post.get('add_pers_label') is not None:
+        if self._posted('add_pers_label'):
             return self._add_pers_label()
 
-        elif post.get('pers_rm_id') is not None:
+        elif self._posted('pers_rm_id'):
             label_id = post.get('pers_rm_id')
             return self._rm_pers_label(label_id)
 
-        elif post.get('pers_rename_id') is not None:
+        elif self._posted('pers_rename_id'):
             return self._rename_pers_label()
 
-        elif post.get('add_home_label') is not None:
+        elif self._posted('add_home_label'):
             return self._add_home_label()
 
-        elif post.get('home_rename_id') is not None:
+        elif self._posted('home_rename_id'):
             return self._rename_home_label()
 
-        elif post.get('home_rm_id') is not None:
+        elif self._posted('home_rm_id'):
             label_id = post.get('home_rm_id')
             return self._rm_home_label(label_id)
 
-        elif post.get('home_default') is not None:
+        elif self._posted('home_default'):
             keep = post.get('home_default') == 'keep'
             return self._restore_home_labels(keep=keep)
 
@@ -446,7 +572,7 @@ class UserLabelsView(BaseUserView):
         form = forms.AddLabelForm(self.request.POST)
         if form.is_valid():
             label = form.save(commit=False)
-            if self.user.has_perm('budget.manage_home_labels'):
+            if self.user.account.has_perm('budget.manage_home_labels'):
                 added = self.user.account.home.add_label(label=label)
                 if added:
                     messages.success(self.request, 'Added a new home label.')
@@ -471,7 +597,7 @@ class UserLabelsView(BaseUserView):
             label = Label.objects.get(id=label_id)
             new_name = form.cleaned_data.get('name')
 
-            if self.user.has_perm('budget.manage_home_labels') and label.home == self.user.account.home:
+            if self.user.account.has_perm('budget.manage_home_labels') and label.home == self.user.account.home:
 
                 if label.rename(new_name=new_name):
                     messages.success(self.request, 'Label renamed.')
@@ -490,7 +616,7 @@ class UserLabelsView(BaseUserView):
         """Removes a new home label if the user has the permissions."""
 
         label = Label.objects.get(id=label_id)
-        if self.user.has_perm('budget.manage_home_labels') and label.home == self.user.account.home:
+        if self.user.account.has_perm('budget.manage_home_labels') and label.home == self.user.account.home:
             label.delete()
             messages.success(self.request, 'Label removed.')
         else:
@@ -501,7 +627,7 @@ class UserLabelsView(BaseUserView):
     def _restore_home_labels(self, keep: bool):
         """Restores the default home labels."""
 
-        if self.user.has_perm('budget.manage_home_labels'):
+        if self.user.account.has_perm('budget.manage_home_labels'):
             self.user.account.home.create_predefined_labels(keep_custom=keep)
             messages.success(self.request, 'Default labels restored.')
         else:
@@ -520,7 +646,8 @@ class CyclicOperationsView(BaseUserView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context['operations'] = self.user.account.get_plans()
+        account = self.user.account
+        context['operations'] = cache.get_fragment('plans', account, lambda: list(account.get_plans()))
 
         form = context.get('add_cyclic_op_form') or forms.PlanCyclicOperationForm.from_account(
             self.user.account)
@@ -531,11 +658,11 @@ class CyclicOperationsView(BaseUserView):
     def post(self, request: HttpRequest, *args, **kwargs):
         post = request.POST
 
-        if post.get('rm_id') is not None:
+        if self._posted('rm_id'):
             op_id = post.get('rm_id')
             return self._rm_plan(op_id)
 
-        elif post.get('add_cyclic_op') is not None:
+        elif self._posted('add_cyclic_op'):
             return self._add_plan()
 
         return self.redirect()
@@ -559,6 +686,7 @@ class CyclicOperationsView(BaseUserView):
         if form.is_valid():
             plan = form.save(commit=False)
             self.user.account.add_operation_plan(plan=plan)
+            plan.materialize()
             messages.success(self.request, 'Cyclic operation plan added.')
             return self.redirect()
         else:
@@ -573,12 +701,12 @@ class BaseHomeView(BaseUserView):
     def setup(self, request: HttpRequest, *args, **kwargs):
         if request.session.get('view_as'):
             del request.session['view_as']
+            reset_account_context(request)
 
         super().setup(request, *args, **kwargs)
 
-        usr = self.user
-        if usr.is_authenticated and hasattr(usr, 'account') and hasattr(usr.account, 'home'):
-            self.home = self.user.account.home
+        if self.account_context.home is not None:
+            self.home = self.account_context.home
 
 
 class HomeView(BaseHomeView):
@@ -600,30 +728,38 @@ class HomeView(BaseHomeView):
             'transaction_form') or forms.TransactionForm()
         context['transaction_form'] = transaction_form
 
+        split_form = context.get('split_form') or forms.SplitTransferForm.from_account(self.user.account)
+        context['split_form'] = split_form
+        context['can_split'] = bool(split_form.fields['direction'].choices)
+
         context['accounts'] = Account.objects.filter(
-            home=self.home).order_by('user__username')
+            home=self.home).for_roster().order_by('user__username')
+        context['currency'] = self.home.currency
 
-        context['manage_users'] = self.user.has_perm('budget.manage_users')
-        context['make_transactions'] = self.user.has_perm(
+        context['manage_users'] = self.user.account.has_perm('budget.manage_users')
+        context['make_transactions'] = self.user.account.has_perm(
             'budget.make_transactions')
 
-        context['can_view_as'] = self.user.has_perm('budget.plan_for_others')
+        context['can_view_as'] = self.user.account.has_perm('budget.plan_for_others')
 
         return context
 
     def post(self, request: HttpRequest, *args, **kwargs):
         post = request.POST
 
-        if post.get('rm_id'):
+        if self._posted('rm_id', allow_empty=False):
             acc_id = post.get('rm_id')
             return self._rm_account(acc_id)
 
-        elif post.get('create') is not None:
+        elif self._posted('create'):
             return self._create_user()
 
-        elif post.get('transaction') is not None:
+        elif self._posted('transaction'):
             return self._make_transaction()
 
+        elif self._posted('split'):
+            return self._split_transfer()
+
         return self.redirect()
 
     def _rm_account(self, acc_id: int):
@@ -631,10 +767,10 @@ class HomeView(BaseHomeView):
 
         acc = Account.objects.get(id=acc_id)
 
-        if self.user.has_perm('budget.manage_users') and self.home == acc.home:
-            if self.user.account.is_admin():
+        if self.user.account.has_perm('budget.manage_users') and self.home == acc.home:
+            if self.account_context.is_admin:
                 acc.delete()
-            elif self.user.account.is_mod() and not acc.is_mod():
+            elif self.account_context.is_mod and not acc.is_mod():
                 acc.delete()
             elif not acc.is_mod():
                 acc.delete()
@@ -653,7 +789,7 @@ class HomeView(BaseHomeView):
             messages.error(self.request, f'Maximum number of Accounts reached ({Home.MAX_ACCOUNTS}).')
             return self.redirect()
         
-        if not self.user.has_perm('budget.manage_users'):
+        if not self.user.account.has_perm('budget.manage_users'):
             messages.error(self.request, 'Cannot create a new user.')
             return self.redirect()
 
@@ -676,15 +812,17 @@ class HomeView(BaseHomeView):
     def _make_transaction(self):
         """Makes a transaction to the specified user."""
 
-        if not self.user.has_perm('budget.make_transactions'):
+        if not self.user.account.has_perm('budget.make_transactions'):
             messages.error(self.request, 'Cannot make a transaction.')
             return self.redirect()
 
         post = self.request.POST
         form = forms.TransactionForm(post)
-        destination = Account.objects.get(id=post.get('transaction'))
+        destination_id = post.get('transaction', '')
+        destination = Account.objects.filter(
+            home=self.home, id=destination_id).exclude(id=self.user.account.id).first() if destination_id.isdigit() else None
         valid = False
-        if form.is_valid():
+        if destination and form.is_valid():
             outcoming, incoming = form.make_transaction(
                 source=self.user.account, destination=destination)
 
@@ -698,6 +836,68 @@ class HomeView(BaseHomeView):
             messages.error(self.request, 'Invalid transaction form.')
             return self.render()
 
+    def _split_transfer(self):
+        """Splits a bill between the chosen members in a single transfer."""
+
+        form = forms.SplitTransferForm.from_account(self.user.account, self.request.POST)
+        if form.is_valid():
+            try:
+                legs = form.make_transfer(self.user.account)
+                messages.success(self.request, f'Split between {len(legs)} member(s).')
+                return self.redirect()
+            except transfers.TransferError as e:
+                form.add_error(None, str(e))
+
+        self.update_context(split_form=form)
+        messages.error(self.request, 'Invalid split form.')
+        return self.render()
+
+
+@method_decorator(
+    (login_required(), home_required()),
+    name='dispatch')
+class TransferApiView(View):
+    """JSON API for split transfers between the user and other Home members.
+
+    The POST body is `{"direction": "send" | "collect", "description": ..., "legs": [{"account": id, "amount": "1.00"}]}`.
+    All the legs are made in a single atomic transfer. Responds with the created operation IDs.
+    """
+
+    def post(self, request: HttpRequest, *args, **kwargs):
+        account = get_account_context(request).actual_account
+
+        try:
+            data = json.loads(request.body)
+            direction = data.get('direction', forms.SplitTransferForm.SEND)
+            description = data.get('description') or None
+            legs = [(int(leg['account']), leg['amount']) for leg in data['legs']]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({'error': 'Invalid request body.'}, status=400)
+
+        if direction == forms.SplitTransferForm.SEND:
+            perm, execute = 'budget.make_transactions', transfers.split
+        elif direction == forms.SplitTransferForm.COLLECT:
+            perm, execute = 'budget.plan_for_others', transfers.collect
+        else:
+            return JsonResponse({'error': 'Invalid direction.'}, status=400)
+        timing.record_action(request, direction)
+
+        if not account.has_perm(perm):
+            return JsonResponse({'error': 'Permission denied.'}, status=403)
+
+        members = Account.objects.filter(home_id=account.home_id).in_bulk([leg[0] for leg in legs])
+        if len(members) != len({leg[0] for leg in legs}):
+            return JsonResponse({'error': 'Unknown account.'}, status=400)
+
+        try:
+            pairs = execute(account, [(members[member_id], amount) for member_id, amount in legs], description)
+        except transfers.TransferError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return JsonResponse({'transfers': [
+            {'outcoming': outcoming.id, 'incoming': incoming.id, 'amount': str(incoming.amount)}
+            for outcoming, incoming in pairs]}, status=201)
+
 
 @method_decorator(
     (login_required(), home_required()),
@@ -735,12 +935,10 @@ class AccountView(BaseUserView):
 
     def post(self, request: HttpRequest, *args, **kwargs):
 
-        post = request.POST
-
-        if post.get('rename') is not None:
+        if self._posted('rename'):
             return self._rename()
 
-        if post.get('remove') is not None:
+        if self._posted('remove'):
             return self._remove()
 
         return self.redirect()
@@ -761,7 +959,7 @@ class AccountView(BaseUserView):
     def _remove(self):
         """Removes the user account or the entire Home."""
 
-        if self.user.account.is_admin():
+        if self.account_context.is_admin:
             self.user.account.home.remove()
             messages.success(self.request, 'Home removed.')
             return redirect('/')
@@ -772,7 +970,7 @@ class AccountView(BaseUserView):
 
 
 @method_decorator(
-    (login_required(), home_required(), permission_required('budget.manage_users')),
+    (login_required(), home_required(), account_perm_required('budget.manage_users')),
     name='dispatch')
 class ManageUserView(BaseHomeView):
     """View for managing a specific user."""
@@ -802,7 +1000,7 @@ class ManageUserView(BaseHomeView):
     def _check_account_and_perm(self, account: Account | None = None):
         """Same as `_check_account()` but checks if the user has the `manage_users` permission."""
 
-        return self.user.has_perm('budget.manage_users') and self._check_account(account)
+        return self.user.account.has_perm('budget.manage_users') and self._check_account(account)
 
     def dispatch(self, request: HttpRequest, *args, **kwargs):
         if self.managed_acc and self._check_account_and_perm():
@@ -816,7 +1014,7 @@ class ManageUserView(BaseHomeView):
         context['managed_acc'] = self.managed_acc
 
         context['is_mod'] = self.managed_acc.is_mod()
-        context['make_mod'] = self.user.has_perm('budget.make_mod')
+        context['make_mod'] = self.user.account.has_perm('budget.make_mod')
 
         form = context.get(
             'perm_form') or forms.ChangeUserPermissionsForm.from_account(self.managed_acc)
@@ -830,24 +1028,22 @@ class ManageUserView(BaseHomeView):
         return context
 
     def post(self, request: HttpRequest, *args, **kwargs):
-        post = request.POST
-
-        if post.get('change') is not None:
+        if self._posted('change'):
             return self._change_perms()
 
-        elif post.get('make_mod') is not None:
+        elif self._posted('make_mod'):
             return self._add_mod()
 
-        elif post.get('remove_mod') is not None:
+        elif self._posted('remove_mod'):
             return self._rm_mod()
 
-        elif post.get('remove') is not None:
+        elif self._posted('remove'):
             return self._rm_user()
 
-        elif post.get('pass_admin') is not None:
+        elif self._posted('pass_admin'):
             return self._pass_admin()
 
-        elif post.get('rename') is not None:
+        elif self._posted('rename'):
             return self._rename()
 
         return self.redirect()
@@ -859,7 +1055,7 @@ class ManageUserView(BaseHomeView):
             messages.error(self.request, 'Cannot change user permissions.')
             return self.redirect()
 
-        if self.managed_acc.is_mod() and not self.user.account.is_admin():
+        if self.managed_acc.is_mod() and not self.account_context.is_admin:
             messages.error(self.request, 'Cannot change moderator permissions.')
             return self.redirect()
 
@@ -881,7 +1077,7 @@ class ManageUserView(BaseHomeView):
             messages.error(self.request, 'Error passing Admin to the specified user.')
             return redirect('/')
 
-        if self.user.account.is_admin():
+        if self.account_context.is_admin:
             self.home.change_admin(self.managed_acc)
             for perm in MOD_PERMS:
                 self.user.account.add_perm(perm[0])
@@ -895,7 +1091,7 @@ class ManageUserView(BaseHomeView):
     def _add_mod(self):
         """Adds a new home moderator."""
 
-        if self._check_account() and self.user.has_perm('budget.make_mod') and not self.managed_acc.is_mod():
+        if self._check_account() and self.user.account.has_perm('budget.make_mod') and not self.managed_acc.is_mod():
             self.home.add_mod(self.managed_acc)
             messages.success(self.request, 'Moderator added.')
         else:
@@ -906,7 +1102,7 @@ class ManageUserView(BaseHomeView):
     def _rm_mod(self):
         """Removes a home mod."""
 
-        if self._check_account() and self.user.has_perm('budget.make_mod') and self.managed_acc.is_mod():
+        if self._check_account() and self.user.account.has_perm('budget.make_mod') and self.managed_acc.is_mod():
             self.home.remove_mod(self.managed_acc)
             messages.success(self.request, 'Moderator removed.')
         else:
@@ -920,7 +1116,7 @@ class ManageUserView(BaseHomeView):
         if self._check_account_and_perm():
             can_remove = False
             if self.managed_acc.is_mod():
-                can_remove = self.user.account.is_admin()
+                can_remove = self.account_context.is_admin
             else:
                 can_remove = True
 
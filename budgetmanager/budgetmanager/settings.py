@@ -46,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'budget.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'budget.middleware.AccountContextMiddleware',
+    'budget.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,7 +62,7 @@ ROOT_URLCONF = 'budgetmanager.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'budget.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -100,6 +103,73 @@ DATABASES = {
 # }
 
 
+# Cache
+# Role lookups (see budget/roles.py) and page fragments (see budget/cache.py) are cached
+# with versioned keys. Deployments running several processes should use a shared backend,
+# e.g. Redis, Memcached or django.core.cache.backends.filebased.FileBasedCache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'budget': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'budget-fragments',
+    },
+}
+
+BUDGET_CACHE_ALIAS = 'budget'
+BUDGET_CACHE_TIMEOUT = 300
+
+
+# Request timing
+# With BUDGET_TIMING enabled the timings of every request (SQL, template, view and total time) are logged
+# to the budget.timing logger and sent to staff users in the Server-Timing header (see budget/middleware.py).
+# Queries slower than BUDGET_SLOW_QUERY_MS milliseconds are logged with their plans.
+
+BUDGET_TIMING = False
+BUDGET_SLOW_QUERY_MS = 100
+
+# Metrics
+# With BUDGET_METRICS enabled the request latency and queries are recorded and exposed with other
+# metrics at /metrics in the Prometheus text format (see budget/metrics.py).
+# Only staff users can read them. To let Prometheus scrape them, set BUDGET_METRICS_TOKEN to a secret
+# and configure the scraper to send it as "Authorization: Bearer <token>". The client address is not
+# trusted, as behind a local reverse proxy every request comes from 127.0.0.1.
+# The request metrics are kept in the memory of each process, so with multiple workers every scrape
+# reports only the worker that served it. The planoperations runs are read from the database.
+
+BUDGET_METRICS = True
+BUDGET_METRICS_TOKEN = None
+
+# Profiling
+# With BUDGET_PROFILING enabled staff users can profile a request with the profile query parameter
+# or the X-Budget-Profile header. Management commands accept the --profile option. The stack samples
+# are written to collapsed stack files in BUDGET_PROFILE_DIR (a temporary directory by default),
+# see budget/profiling.py.
+
+BUDGET_PROFILING = True
+BUDGET_PROFILE_DIR = None
+BUDGET_PROFILE_INTERVAL = 0.005
+BUDGET_PROFILE_MAX_SAMPLES = 20000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'budget.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 